@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+from glob import glob
+
+import item_pages
+
+REPEAT = 5
+
+
+def chunked(data, size=item_pages.CHUNK_SIZE):
+    for i in range(0, len(data), size):
+        yield data[i:i+size]
+
+
+def best_time(func, data):
+    """The best time of a few runs, and the result."""
+    best = None
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        result = func(data)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def fast(data):
+    return item_pages.price_range_from_chunks(chunked(data))
+
+
+if __name__ == '__main__':
+    # argument: the directory with the item pages
+    itemdir = sys.argv[1] if len(sys.argv) > 1 else 'items'
+    files = sorted(glob(os.path.join(itemdir, '*.html')))
+    total_fast = total_full = 0.0
+    total_bytes = scanned_bytes = 0
+    mismatches = fallbacks = 0
+    for fname in files:
+        with open(fname, 'rb') as fp:
+            data = fp.read()
+        t_fast, r_fast = best_time(fast, data)
+        t_full, r_full = best_time(item_pages.parse_price_range, data)
+        price_range, scanned = item_pages.scan_price_range(chunked(data))
+        if price_range is None:
+            fallbacks += 1
+        if r_fast != r_full:
+            mismatches += 1
+            print("MISMATCH: %s: %s vs %s" % (fname, r_fast, r_full))
+        total_fast += t_fast
+        total_full += t_full
+        total_bytes += len(data)
+        scanned_bytes += len(scanned)
+    if not files:
+        print("no item pages in %s" % itemdir)
+        sys.exit(1)
+    print("%d pages, %d fell back to the full parser, %d mismatches" % (len(files), fallbacks, mismatches))
+    print("fast:  %8.2f ms total, %.1f%% of the bytes read" % (1000 * total_fast, 100.0 * scanned_bytes / max(total_bytes, 1)))
+    print("full:  %8.2f ms total" % (1000 * total_full))
+    print("speedup: %.1fx" % (total_full / total_fast if total_fast else 0.0))
@@ -1,21 +1,68 @@
 #!/usr/bin/env python3
 
+import os
 import sys
-from bs4 import BeautifulSoup
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
 
-if __name__ == '__main__':
-    changelogfile = sys.argv[1]
-    f = open(changelogfile)
-    html = f.read()
-    f.close()
-    phtml = BeautifulSoup(html, "lxml")
-    body = phtml.body
-    for a in body.findAll("a"):
-        try:
-            href = a.attrs['href']
-        except:
-            continue
-        if href.find("taustation.space/item/") >= 0:
-            slug = href.split('/')[-1]
-            print(slug)
+CHUNK_SIZE = 64 * 1024
+ITEM_URL = "taustation.space/item/"
+
+
+class ItemLinkParser(HTMLParser):
+    """Collects the slugs of item links, without building a document tree."""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.slugs = []
+    def handle_starttag(self, tag, attrs):
+        if tag != 'a': return
+        for name, value in attrs:
+            if name == 'href' and value and value.find(ITEM_URL) >= 0:
+                slug = value.split('#')[0].split('?')[0].rstrip('/').split('/')[-1]
+                if slug:
+                    self.slugs.append(slug)
+
+
+def extract_slugs(changelogfile):
+    """The item slugs linked from the changelog, in order of appearance."""
+    parser = ItemLinkParser()
+    with open(changelogfile, errors='replace') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk: break
+            parser.feed(chunk)
+    parser.close()
+    return parser.slugs
 
+
+def find_changelogs(paths):
+    """The given files, and the HTML files in the given directories."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                files.extend(os.path.join(dirpath, fn) for fn in sorted(filenames)
+                             if fn.endswith('.html') or fn.endswith('.htm'))
+        else:
+            files.append(path)
+    return files
+
+
+if __name__ == '__main__':
+    # -s: also print the changelog where the slug was first found
+    args = sys.argv[1:]
+    show_source = '-s' in args
+    paths = [ a for a in args if a != '-s' ]
+    changelogs = find_changelogs(paths)
+    # parse in parallel, but report in the order of the files
+    source_by_slug = {}
+    with ProcessPoolExecutor() as executor:
+        for changelogfile, slugs in zip(changelogs, executor.map(extract_slugs, changelogs, chunksize=8)):
+            for slug in slugs:
+                if slug in source_by_slug: continue
+                source_by_slug[slug] = changelogfile
+                if show_source:
+                    print("%s\t%s" % (slug, changelogfile))
+                else:
+                    print(slug)
@@ -1,18 +1,21 @@
 #!/usr/bin/env python3
 
 import sys
+import csv
 import math
 import json
-import requests
 from copy import deepcopy
-from bs4 import BeautifulSoup
 
 from diskcache import Cache
 from datetime import date
 
+import intervals
+import item_pages
+import taunet
+from intervals import fpc_interval, price_range
+
 
 DEBUG = True
-INTERVAL_THRESHOLD = 0.5
 
 
 def debug_print(*msg):
@@ -22,20 +25,14 @@ def debug_print(*msg):
 
 def _get_minmax(slug):
     # print('_get_minmax({})'.format(slug))
-    url = "https://taustation.space/item/" + slug
-    req = requests.get(url)
-    if req.status_code != 200:
-        raise Exception('Cannot get {}: {}'.format(url, req.text))
-    phtml = BeautifulSoup(req.text, "lxml")
-    tag = phtml.body.find('span', attrs={'class':"currency"})
-    children = list(tag.children)
-    price_range = children[0]
-    a,b = price_range.split(" - ")
-    mn = float(a)
-    mx = float(b)
-    return (mn,mx)
+    return item_pages.get_price_range(slug)
+
+# slugs whose prices were requested, to measure the number of item lookups
+looked_up_slugs = set()
+
 
 def get_minmax(cache, slug):
+    looked_up_slugs.add(slug)
     day = str(date.today())
     cache_key = '{}/{}'.format(day, slug)
     result = cache.get(cache_key)
@@ -56,6 +53,8 @@ def read_items(jsondata):
             print("incomplete data on %s (%s)" % (station, system))
             return []
         fuelprice = station_info['fuel_price_per_g']
+        # set for fuel prices estimated by vendor-anomalies.py
+        fuelprice_error = station_info.get('fuel_price_error')
         for (vendor,inventory) in station_info['vendors'].items():
             for (slug,itemprice) in inventory.items():
                 entry = {
@@ -65,6 +64,7 @@ def read_items(jsondata):
                     'Station'  : station,
                     'System'   : system,
                     'FuelPrice': fuelprice,
+                    'FuelPriceError': fuelprice_error,
                     'FuelPriceCoefficient': itemprice/fuelprice
                 }
                 entries.append(entry)
@@ -82,165 +82,379 @@ def entries_by_key(entries, key):
     return collected_entries
 
 
-def equals_approx(a, b, tolerance=1.0):
+class Interval(intervals.Interval):
     """
-    Returns True if a==b within the given absolute tolerance.
+    The bounds for a station's fuel price, narrowed down by each new observation,
+    and how likely the values within them are.
     """
-    return abs(a-b) <= tolerance
-
+    def __init__(self):
+        super().__init__()
+        self.belief = intervals.WeightedIntervals()
 
-def median(numbers):
+    def update(self, a, b):
+        narrowed = self.intersect(intervals.Interval(a, b))
+        if narrowed.is_empty():
+            # the bounds are guaranteed, so the data must be inconsistent
+            debug_print("  WARNING: [%.2f, %.2f] doesn't overlap %s, ignored" % (a, b, self))
+            return
+        self.min = narrowed.min
+        self.max = narrowed.max
+        restricted = self.belief.restrict(self)
+        self.belief = restricted if restricted.is_known() else intervals.WeightedIntervals([(narrowed, 1.0)])
+
+    def observe(self, belief):
+        """Add the evidence of an item lookup (WeightedIntervals)."""
+        combined = self.belief.combine(belief).restrict(self)
+        if combined.is_known():
+            self.belief = combined
+
+    def estimate(self):
+        """The point estimate and the confidence in it."""
+        if self.is_converged():
+            return (self.midpoint(), 1.0)
+        return self.belief.estimate()
+
+
+# how much the fuel prices may have changed since the vendor data was
+# recorded (relative), for the likelihood that an item's price rank still holds
+PRICE_DRIFT = 0.1
+# stop looking up more items for a station once the next lookup is expected
+# to reduce the uncertainty by less than this fraction
+MIN_REDUCTION = 0.01
+# lower limit for the likelihood that two stations have the same price
+TIE_LIKELIHOOD = 0.01
+# rounds of recomputing the beliefs from each other
+REFRESH_ROUNDS = 3
+
+
+def rank_likelihoods(cleaned_entries_by_station, available_on_station_by_slug):
     """
-    Returns the median of a list of already sorted numbers.
+    For each station and slug, the likelihood that the station's price of the
+    item is the min, the max, or in between of the range shown on the item page,
+    from the ranks of the recorded prices.  The larger the gap to the next
+    price, the less likely a changed fuel price has swapped the ranks.
+    Returns a dict (station, slug) -> (p_min, p_max, p_inside).
     """
-    l = len(numbers)
-    if l % 2 == 1:
-        return numbers[ l // 2 + 1]
-    else:
-        return (numbers[l // 2] + numbers[l // 2 + 1]) / 2
+    likelihoods = {}
+    for slug, slug_stations in available_on_station_by_slug.items():
+        prices = {}
+        for station in slug_stations:
+            if slug in cleaned_entries_by_station[station]:
+                prices[station] = float(cleaned_entries_by_station[station][slug][0]['ItemPrice'])
+        n = len(slug_stations)
+        if n == 1:
+            for station in prices:
+                likelihoods[(station, slug)] = (0.5, 0.5, 0.0)
+            continue
+        if not prices: continue
+        # with probability stay, the recorded rank still holds, otherwise any
+        # station can be the min or max (also when some prices are missing)
+        ranked = sorted(prices.values())
+        lowest, highest = ranked[0], ranked[-1]
+        stay_min = stay_max = 0.0
+        if len(ranked) == n:
+            stay_min = 1.0 - math.exp(-(ranked[1] - lowest) / lowest / PRICE_DRIFT)
+            stay_max = 1.0 - math.exp(-(highest - ranked[-2]) / ranked[-2] / PRICE_DRIFT)
+        for station, price in prices.items():
+            p_min = (1.0 - stay_min) / n + (stay_min if price == lowest else 0.0)
+            p_max = (1.0 - stay_max) / n + (stay_max if price == highest else 0.0)
+            # with two stations, each is either the min or the max
+            p_inside = 0.0 if n == 2 else max(0.0, 1.0 - p_min - p_max)
+            total = p_min + p_max + p_inside
+            likelihoods[(station, slug)] = (p_min / total, p_max / total, p_inside / total)
+    return likelihoods
+
+
+def slug_belief(station, slug, itemprice_min, itemprice_max, likelihoods, fuelprice_by_station,
+        cleaned_entries_by_station, available_on_station_by_slug):
+    """
+    What the item's price range tells about the station's fuel price: the
+    station's price is the min, the max or in between, each with its likelihood.
+    The min (max) is less likely ours if other stations probably have it.
+    """
+    entry = cleaned_entries_by_station[station][slug][0]
+    fpc = fpc_interval(entry['ItemPrice'], entry['FuelPrice'], entry['FuelPriceError'])
+    p_min, p_max, p_inside = likelihoods[(station, slug)]
+    for other_station in available_on_station_by_slug[slug]:
+        if other_station == station: continue
+        other_fuelprice = fuelprice_by_station.get(other_station)
+        if other_fuelprice is None or not slug in cleaned_entries_by_station[other_station]: continue
+        other_entry = cleaned_entries_by_station[other_station][slug][0]
+        other_fpc = fpc_interval(other_entry['ItemPrice'], other_entry['FuelPrice'], other_entry['FuelPriceError'])
+        q_min = other_fuelprice.belief.probability(intervals.Interval.rounded(itemprice_min) / other_fpc)
+        q_max = other_fuelprice.belief.probability(intervals.Interval.rounded(itemprice_max) / other_fpc)
+        # the prices may be equal, so never rule it out completely
+        p_min *= max(1.0 - q_min, TIE_LIKELIHOOD)
+        p_max *= max(1.0 - q_max, TIE_LIKELIHOOD)
+    return intervals.WeightedIntervals([
+        (intervals.Interval.rounded(itemprice_min) / fpc, p_min),
+        (intervals.Interval.rounded(itemprice_max) / fpc, p_max),
+        (price_range(itemprice_min, itemprice_max) / fpc, p_inside)
+    ])
+
+
+def refresh_beliefs(fuelprice_by_station, considered_slugs_by_station, get_range, likelihoods,
+        cleaned_entries_by_station, available_on_station_by_slug):
+    """
+    Recompute the beliefs of the stations that haven't converged from all
+    their items, now that more is known about the other stations.  As each
+    station's belief depends on the others, this is repeated a few times.
+    """
+    for _ in range(REFRESH_ROUNDS):
+        for station, fuelprice_interval in fuelprice_by_station.items():
+            if fuelprice_interval.is_converged(): continue
+            belief = intervals.WeightedIntervals()
+            for slug in considered_slugs_by_station[station]:
+                itemprice_min, itemprice_max = get_range(slug)
+                belief = belief.combine(slug_belief(station, slug, itemprice_min, itemprice_max, likelihoods,
+                    fuelprice_by_station, cleaned_entries_by_station, available_on_station_by_slug))
+            belief = belief.restrict(fuelprice_interval)
+            if belief.is_known():
+                fuelprice_interval.belief = belief
 
 
-def find_most_common_number(l, ACCURACY=0.05):
+def expected_spread(station, slug, fuelprice_interval, fuelprice_by_station, predicted_ranges, likelihoods,
+        cleaned_entries_by_station, available_on_station_by_slug):
+    """
+    The uncertainty of the station's fuel price after looking up the item,
+    predicted from the recorded prices, as if all fuel prices had changed
+    like the current estimate of this station's.
     """
-    In a list of numbers, find one number that is the most common,
-    barring some wiggle room for inaccuracies.
-    Returns the most common number, or None if there is not one
-    clear most common number.
+    itemprice_min, itemprice_max = predicted_ranges[slug]
+    estimate, confidence = fuelprice_interval.estimate()
+    if estimate is not None:
+        scale = estimate / float(cleaned_entries_by_station[station][slug][0]['FuelPrice'])
+        itemprice_min, itemprice_max = itemprice_min * scale, itemprice_max * scale
+    belief = slug_belief(station, slug, itemprice_min, itemprice_max, likelihoods,
+        fuelprice_by_station, cleaned_entries_by_station, available_on_station_by_slug)
+    return fuelprice_interval.belief.combine(belief).spread()
+
+
+def choose_slug(station, candidates, fuelprice_interval, fuelprice_by_station, fetched,
+        predicted_ranges, likelihoods, cleaned_entries_by_station, available_on_station_by_slug):
     """
-    previous = None
-    current_streak = []
-    streaks = []
-    for n in sorted(l):
-        if previous is None:
-            previous = n
-            current_streak = [n]
+    The candidate slug whose lookup is expected to reduce the uncertainty of the
+    station's fuel price the most; items already looked up come first, as they
+    cost nothing.  Returns None if no lookup is worth it.
+    """
+    spread = fuelprice_interval.belief.spread()
+    best = None
+    for index, slug in enumerate(candidates):
+        after = expected_spread(station, slug, fuelprice_interval, fuelprice_by_station,
+            predicted_ranges, likelihoods, cleaned_entries_by_station, available_on_station_by_slug)
+        worth_it = after < spread * (1.0 - MIN_REDUCTION)
+        free = slug in fetched
+        if not worth_it and not free: continue
+        key = (not (free and worth_it), after, index)
+        if best is None or key < best[0]:
+            best = (key, slug)
+    return best[1] if best else None
+
+
+def pin_fuelprice(station, slug, itemprice_min, itemprice_max, fuelprice_interval,
+        fuelprice_by_station, entries_by_station, available_on_station_by_slug):
+    """
+    Try to find out whether the item's min or max price is the one on this station,
+    by ruling out the other stations where the item is available.
+    Returns the resulting fuel price interval, or None.
+    """
+    # keep track of which stations are compatible with the min/max itemprice
+    # the goal is to reduce either of them to just one station
+    stations_compatible_with_min = deepcopy( available_on_station_by_slug[slug] )
+    stations_compatible_with_max = deepcopy( available_on_station_by_slug[slug] )
+
+    # run over the other stations where this item is available
+    for other_station in available_on_station_by_slug[slug]:
+        if other_station == station: continue
+        # the bounds are guaranteed, so even a station that hasn't
+        # converged yet can rule out the min or max price
+        other_fuelprice = fuelprice_by_station.get(other_station, Interval())
+        if not other_fuelprice.is_bounded():
+            debug_print("    available on %s, but fuelprice not known" % other_station)
             continue
-        diff = (n - previous) / n
-        if diff <= ACCURACY:
-            current_streak.append(n)
-        else:
-            streaks.append(current_streak)
-            current_streak = [n]
-        previous = n
-    streaks.append(current_streak)
+        # get other station's itemprice
+        other_station_entries = entries_by_station[other_station]
+        other_station_entries_by_slug = entries_by_key(other_station_entries, 'slug')
+        other_entry = other_station_entries_by_slug[slug][0]
+        other_fpc = fpc_interval(other_entry['ItemPrice'], other_entry['FuelPrice'], other_entry['FuelPriceError'])
+        other_itemprice = other_fpc * other_fuelprice
+        debug_print("    available on %s for %s" % (other_station, other_itemprice))
+        # now check compatibility
+        if not other_itemprice.overlaps(intervals.Interval.rounded(itemprice_min)):
+            stations_compatible_with_min.remove(other_station)
+        if not other_itemprice.overlaps(intervals.Interval.rounded(itemprice_max)):
+            stations_compatible_with_max.remove(other_station)
+
+    # get this item's FPC on this station
+    station_entries = entries_by_station[station]
+    station_entries_by_slug = entries_by_key(station_entries, 'slug')
+    entry = station_entries_by_slug[slug][0]
+    fpc = fpc_interval(entry['ItemPrice'], entry['FuelPrice'], entry['FuelPriceError'])
+
+    fuelprice = None
+    # is the min price only compatible with one station? (it will be the current station)
+    if len(stations_compatible_with_min) == 1:
+        assert(stations_compatible_with_min.pop() == station)
+        itemprice = itemprice_min
+        fuelprice = intervals.Interval.rounded(itemprice_min) / fpc
+        if not fuelprice_interval.overlaps(fuelprice):
+            debug_print("    WARNING: min price %.2f only compatible here" % itemprice_min)
+            debug_print("             but fuelprice %s not inside %s" % (fuelprice, fuelprice_interval))
+            fuelprice = None
+
+    # same check for max price (unless resolved)
+    if (not fuelprice) and len(stations_compatible_with_max) == 1:
+        assert(stations_compatible_with_max.pop() == station)
+        itemprice = itemprice_max
+        fuelprice = intervals.Interval.rounded(itemprice_max) / fpc
+        if not fuelprice_interval.overlaps(fuelprice):
+            debug_print("    WARNING: max price %.2f only compatible here" % itemprice_max)
+            debug_print("             but fuelprice %s not inside %s" % (fuelprice, fuelprice_interval))
+            fuelprice = None
+
+    if fuelprice:
+        debug_print("    => itemprice here = %.2f" % itemprice)
+    return fuelprice
+
+
+def greedy_slug_order(station_entries_by_slug, available_on_station_by_slug):
+    """
+    The slugs available on a station, sorted by low availability, then high price.
+    """
+    station_slugs = list(station_entries_by_slug.keys())
+    station_slugs.sort(key = lambda slug: station_entries_by_slug[slug][0]['ItemPrice'], reverse=True)
+    station_slugs.sort(key = lambda slug: len(available_on_station_by_slug[slug]))
+    return station_slugs
 
-    sorted_streaks = sorted(streaks, key=lambda s: -len(s))
-    winning_streak = sorted_streaks[0]
 
-    if len(winning_streak) == 1:
-        # seems we have no similar numbers at all
-        return None
-    if len(sorted_streaks) > 1 and len(winning_streak) == len(sorted_streaks[1]):
-        # we have two clusters of similar numbers with the same size,
-        # so don't assume we have a winner
-        return None
+def predict_price_ranges(entries):
+    """
+    The price range of each slug, as it would be shown on the item page
+    if the fuel prices were still the recorded ones.
+    """
+    ranges = {}
+    for slug, slug_entries in entries_by_key(entries, 'slug').items():
+        prices = [ float(e['ItemPrice']) for e in slug_entries ]
+        ranges[slug] = (min(prices), max(prices))
+    return ranges
 
-    return median(winning_streak)
 
+def plan_lookups(cleaned_entries_by_station, available_on_station_by_slug):
+    """
+    Plan a small set of item lookups that is expected to resolve all stations,
+    using the recorded prices as prediction of the item pages.
+    A lookup resolves a station if the predicted price range pins down its
+    fuel price on its own, or if all other stations carrying the item are
+    resolved already and the station's price is the item's unique min or max.
+    Greedy set cover: repeatedly pick the slug that resolves the most stations.
+    Returns a list of (slug, stations resolved by it), in order of lookup.
+    """
+    # precompute what a lookup of each slug can tell about each station
+    alone = {}       # slug -> stations resolved by the slug alone
+    pinnable = {}    # slug -> stations resolved once all others are resolved
+    for slug, slug_stations in available_on_station_by_slug.items():
+        prices = {}
+        for station in slug_stations:
+            station_entries_by_slug = cleaned_entries_by_station[station]
+            if slug in station_entries_by_slug:
+                prices[station] = float(station_entries_by_slug[slug][0]['ItemPrice'])
+        if not prices: continue
+        mn = min(prices.values())
+        mx = max(prices.values())
+        alone[slug] = set()
+        pinnable[slug] = set()
+        for station, price in prices.items():
+            entry = cleaned_entries_by_station[station][slug][0]
+            fpc = fpc_interval(entry['ItemPrice'], entry['FuelPrice'], entry['FuelPriceError'])
+            if (price_range(mn, mx) / fpc).is_converged():
+                alone[slug].add(station)
+            elif len(prices) > 1 and len(slug_stations) == len(prices):
+                # the other stations can only be ruled out if none of them is ambiguous
+                others = [ p for st,p in prices.items() if st != station ]
+                if price < min(others) or price > max(others):
+                    pinnable[slug].add(station)
+
+    plan = []
+    resolved = set()
+    while True:
+        best_slug = None
+        best_gain = set()
+        for slug in alone:
+            gain = alone[slug] - resolved
+            for station in pinnable[slug] - resolved:
+                if available_on_station_by_slug[slug] - {station} <= resolved:
+                    gain.add(station)
+            if len(gain) > len(best_gain):
+                best_slug = slug
+                best_gain = gain
+        if best_slug is None:
+            break
+        plan.append((best_slug, best_gain))
+        resolved |= best_gain
+    return plan
 
-class Interval:
-    def __init__(self):
-        self.min = -math.inf
-        self.max = math.inf
-        self.prices_seen = []
 
-    def update(self, a, b):
-        self.prices_seen.append(a)
-        self.prices_seen.append(b)
-        if a > self.min:
-            self.min = a
-        if b < self.max:
-            self.max = b
-
-    def guess(self):
-        return find_most_common_number(self.prices_seen)
-
-    def length(self):
-        return (self.max - self.min)
-    def is_converged(self):
-        return self.length() < INTERVAL_THRESHOLD
-    def __str__(self):
-        return "[%.2f, %.2f]" % (self.min, self.max)
-    def midpoint(self):
-        return 0.5 * (self.min + self.max)
-    def contains(self, a):
-        return (a >= self.min - INTERVAL_THRESHOLD) and (a <= self.max + INTERVAL_THRESHOLD)
-
-
-with Cache(directory='item-price-cache') as cache:
-
-    # ingest correlation data from file or URL
-    if len(sys.argv) > 1:
-        with open(sys.argv[1]) as f:
-            stations_json = json.load(f)
-    else:
-        url = "https://tracker.tauguide.de/v1/special/fuel-vendor-correlation"
-        req = requests.get(url)
-        if req.status_code != 200:
-            raise Exception('Cannot get {}: {}'.format(url, req.text))
-        stations_json = json.loads(req.text)
-
-    # read all entries
-    entries = read_items(stations_json)
-    if not entries:
-        print("Not enough data, giving up")
-        sys.exit(1)
-    # each entry has: slug, ItemPrice, Vendor, Station, System, FuelPrice, FuelPriceCoefficient
-
-    # map stations to short names
-    shortname_by_station = { info['station']['name'] : info['station']['short'] for info in stations_json }
-
-    # get list of stations (having vendors), and entries available per station
-    stations = set( e['Station'] for e in entries)
-    nstations = len(stations)
-    entries_by_station = entries_by_key(entries, 'Station')
-
-    # for each slug, get the list of stations where it is available
-    available_on_station_by_slug = {}
-    for entry in entries:
-        slug = entry['slug']
-        station = entry['Station']
-        if not slug in available_on_station_by_slug:
-            available_on_station_by_slug[slug] = set()
-        available_on_station_by_slug[slug].add(station)
-
-    # run over all stations
+def apply_plan(plan, cleaned_entries_by_station, available_on_station_by_slug):
+    """
+    Order the stations and their slugs according to the plan.  The planned slug
+    of a station comes first, followed by the greedy order as fallback.
+    Returns the station order and the slugs to consider for each station.
+    """
+    station_order = []
+    slugs_by_station = {}
+    for slug, resolved in plan:
+        for station in sorted(resolved):
+            station_order.append(station)
+            slugs_by_station[station] = [slug]
+    for station in cleaned_entries_by_station:
+        if not station in slugs_by_station:
+            station_order.append(station)
+            slugs_by_station[station] = []
+        greedy = greedy_slug_order(cleaned_entries_by_station[station], available_on_station_by_slug)
+        slugs_by_station[station] += [ slug for slug in greedy if slug not in slugs_by_station[station] ]
+    return station_order, slugs_by_station
+
+
+def phase1(station_order, slugs_by_station, planned_slug_by_station, get_range,
+        predicted_ranges, likelihoods,
+        cleaned_entries_by_station, entries_by_station, available_on_station_by_slug, in_order=False):
+    """
+    Narrow down the fuel price of each station by looking up its items, the
+    planned one first, then the one expected to reduce the uncertainty most,
+    until converged or no lookup is worth it. With in_order, the items are
+    looked up in the given order instead, until converged.
+    Returns the fuel price intervals, the slugs considered per station,
+    and the number of converged stations.
+    """
     nconverged = 0
     fuelprice_by_station = {}
     considered_slugs_by_station = {}
-    debug_print("### PHASE 1 ###")
-    for station in stations:
+    fetched = set()
+    for station in station_order:
 
         debug_print("STATION =", station)
 
         # remember the slugs that are considered for fuel price prediction
         considered_slugs_by_station[station] = []
 
-        # collect vendor entries for this station
-        station_entries = entries_by_station[station]
-        # get items available on this station
-        station_entries_by_slug = entries_by_key(station_entries, 'slug')
-        debug_print("  items available: ", len(station_entries_by_slug))
-        # remove slugs with ambiguous pricing
-        cleaned_entries = {}
-        for slug, slug_entries in station_entries_by_slug.items():
-            if len(slug_entries) != 1:
-                prices = set(e['ItemPrice'] for e in slug_entries)
-                if len(prices) != 1:
-                    debug_print("  ambiguous pricing: discarding '%s' on %s" % (slug, station))
-                    continue
-            cleaned_entries[slug] = slug_entries
-        station_entries_by_slug = cleaned_entries
-        debug_print("  items left: ", len(station_entries_by_slug))
-
-        # sort slugs by low availabilty, then high price
-        station_slugs = list(station_entries_by_slug.keys())
-        station_slugs.sort(key = lambda slug: station_entries_by_slug[slug][0]['ItemPrice'], reverse=True)
-        station_slugs.sort(key = lambda slug: len(available_on_station_by_slug[slug]))
+        station_entries_by_slug = cleaned_entries_by_station[station]
 
         fuelprice_interval = Interval()
         station_combinations = []
-        for slug in station_slugs:
+        candidates = list(slugs_by_station[station])
+        planned = planned_slug_by_station.get(station)
+        while candidates:
+            if planned in candidates:
+                slug = planned
+            elif in_order:
+                slug = candidates[0]
+            else:
+                slug = choose_slug(station, candidates, fuelprice_interval, fuelprice_by_station, fetched,
+                    predicted_ranges, likelihoods, cleaned_entries_by_station, available_on_station_by_slug)
+                if slug is None:
+                    debug_print("  no lookup expected to help")
+                    break
+            candidates.remove(slug)
             # if this item is available on other stations...
             if len(available_on_station_by_slug[slug]) > 1:
                 # then check if this combination of stations has already been considered previously
@@ -254,11 +468,20 @@ with Cache(directory='item-price-cache') as cache:
             considered_slugs_by_station[station].append(slug)
             
             # update potential fuel price range
-            fpc = station_entries_by_slug[slug][0]['FuelPriceCoefficient']
-            itemprice_min, itemprice_max = get_minmax(cache, slug)
-            fuelprice_min = itemprice_min / fpc
-            fuelprice_max = itemprice_max / fpc
-            fuelprice_interval.update(fuelprice_min, fuelprice_max)
+            entry = station_entries_by_slug[slug][0]
+            fpc = fpc_interval(entry['ItemPrice'], entry['FuelPrice'], entry['FuelPriceError'])
+            itemprice_min, itemprice_max = get_range(slug)
+            fetched.add(slug)
+            fuelprice = price_range(itemprice_min, itemprice_max) / fpc
+            fuelprice_interval.update(fuelprice.min, fuelprice.max)
+            fuelprice_interval.observe(slug_belief(station, slug, itemprice_min, itemprice_max, likelihoods,
+                fuelprice_by_station, cleaned_entries_by_station, available_on_station_by_slug))
+            # stations handled before may already tell which end of the price range is ours
+            if len(available_on_station_by_slug[slug]) > 1:
+                fuelprice = pin_fuelprice(station, slug, itemprice_min, itemprice_max, fuelprice_interval,
+                    fuelprice_by_station, entries_by_station, available_on_station_by_slug)
+                if fuelprice:
+                    fuelprice_interval.update(fuelprice.min, fuelprice.max)
             debug_print("  after '%s': fuelprice = %s" % (slug, fuelprice_interval))
             if fuelprice_interval.is_converged():
                 nconverged += 1
@@ -268,107 +491,206 @@ with Cache(directory='item-price-cache') as cache:
         # store result
         fuelprice_by_station[station] = fuelprice_interval
 
-    # run over all stations again, if necessary multiple times
-    iteration = 0
-    while nconverged < nstations:
-        iteration += 1
-        debug_print("### PHASE 2 # Iteration=%d ###" % iteration)
-        prev_nconverged = nconverged # to check progress
+    return fuelprice_by_station, considered_slugs_by_station, nconverged
 
-        for station in stations:
-            # skip station if converged
-            if fuelprice_by_station[station].is_converged(): continue
 
-            debug_print("STATION =", station)
+def count_lookups(station_order, slugs_by_station, planned_slug_by_station, predicted_ranges, likelihoods,
+        cleaned_entries_by_station, entries_by_station, available_on_station_by_slug, in_order=False):
+    """
+    Run phase 1 on the predicted price ranges, and count the item lookups.
+    """
+    global DEBUG
+    looked_up = set()
+    def get_range(slug):
+        looked_up.add(slug)
+        return predicted_ranges[slug]
+    debug = DEBUG
+    DEBUG = False
+    phase1(station_order, slugs_by_station, planned_slug_by_station, get_range, predicted_ranges, likelihoods,
+        cleaned_entries_by_station, entries_by_station, available_on_station_by_slug, in_order)
+    DEBUG = debug
+    return len(looked_up)
+
+
+def write_result(fname, fuelprice_by_station, shortname_by_station):
+    """Write the estimate per station to a JSON or CSV file (by extension)."""
+    rows = []
+    for station in sorted(fuelprice_by_station):
+        fp = fuelprice_by_station[station]
+        estimate, confidence = fp.estimate()
+        rows.append({
+            'station': station,
+            'short': shortname_by_station[station],
+            'estimate': None if estimate is None else round(estimate, 2),
+            'min': round(fp.min, 2) if fp.is_bounded() else None,
+            'max': round(fp.max, 2) if fp.is_bounded() else None,
+            'confidence': round(confidence, 3),
+            'converged': fp.is_converged()
+        })
+    with open(fname, 'w') as fp:
+        if fname.endswith('.csv'):
+            cw = csv.DictWriter(fp, list(rows[0].keys()))
+            cw.writeheader()
+            cw.writerows(rows)
+        else:
+            json.dump(rows, fp, indent=1)
 
-            # get the current interval
-            fuelprice_interval = fuelprice_by_station[station]
 
-            for slug in considered_slugs_by_station[station]:
-                debug_print("  slug =", slug)
-                itemprice_min, itemprice_max = get_minmax(cache, slug)
-                debug_print("    itemprice range = %.2f — %.2f" % (itemprice_min, itemprice_max))
-
-                # keep track of which stations are compatible with the min/max itemprice
-                # the goal is to reduce either of them to just one station
-                stations_compatible_with_min = deepcopy( available_on_station_by_slug[slug] )
-                stations_compatible_with_max = deepcopy( available_on_station_by_slug[slug] )
-
-                # run over the other stations where this item is available
-                for other_station in available_on_station_by_slug[slug]:
-                    if other_station == station: continue
-                    if not fuelprice_by_station[other_station].is_converged():
-                        debug_print("    available on %s, but fuelprice not known" % other_station)
-                        continue
-                    # get other station's itemprice
-                    other_fuelprice = fuelprice_by_station[other_station].midpoint()
-                    other_station_entries = entries_by_station[other_station]
-                    other_station_entries_by_slug = entries_by_key(other_station_entries, 'slug')
-                    other_fpc = other_station_entries_by_slug[slug][0]['FuelPriceCoefficient']
-                    other_itemprice = other_fpc * other_fuelprice
-                    debug_print("    available on %s for %.2f" % (other_station, other_itemprice))
-                    # now check compatibility
-                    if not equals_approx(other_itemprice, itemprice_min):
-                        stations_compatible_with_min.remove(other_station)
-                    if not equals_approx(other_itemprice, itemprice_max):
-                        stations_compatible_with_max.remove(other_station)
-
-                # get this item's FPC on this station
-                station_entries = entries_by_station[station]
-                station_entries_by_slug = entries_by_key(station_entries, 'slug')
-                fpc = station_entries_by_slug[slug][0]['FuelPriceCoefficient']
-
-                fuelprice = None
-                # is the min price only compatible with one station? (it will be the current station)
-                if len(stations_compatible_with_min) == 1:
-                    assert(stations_compatible_with_min.pop() == station)
-                    itemprice = itemprice_min
-                    fuelprice = itemprice_min / fpc
-                    if not fuelprice_interval.contains(fuelprice):
-                        debug_print("    WARNING: min price %.2f only compatible here" % itemprice_min)
-                        debug_print("             but fuelprice %.2f not inside %s" % (fuelprice, fuelprice_interval))
-                        fuelprice = None
-
-                # same check for max price (unless resolved)
-                if (not fuelprice) and len(stations_compatible_with_max) == 1:
-                    assert(stations_compatible_with_max.pop() == station)
-                    itemprice = itemprice_max
-                    fuelprice = itemprice_max / fpc
-                    if not fuelprice_interval.contains(fuelprice):
-                        debug_print("    WARNING: max price %.2f only compatible here" % itemprice_max)
-                        debug_print("             but fuelprice %.2f not inside %s" % (fuelprice, fuelprice_interval))
-                        fuelprice = None
-
-                if (not fuelprice): continue # move on to next item
-                debug_print("    => itemprice here = %.2f" % itemprice)
-                debug_print("  => fuelprice = %.2f" % fuelprice)
-
-                # store result
-                nconverged += 1
-                fuelprice_interval.update(fuelprice, fuelprice)
-                # don't need to consider more items
-                break
-        
-        # check progress
-        if nconverged == prev_nconverged:
-            # no :(
-            debug_print("no progress, giving up")
-            break
+if __name__ == '__main__':
+    with Cache(directory='item-price-cache') as cache:
 
-    debug_print("resolved %d/%d stations after %d iterations" % (nconverged, nstations, iteration))
+        # -o FILE: also write the result to a JSON or CSV file
+        args = sys.argv[1:]
+        outfile = None
+        if '-o' in args:
+            i = args.index('-o')
+            outfile = args[i+1]
+            del args[i:i+2]
 
-    # print result
-    # sort stations by fuelprice midpoint
-    for station in sorted(stations, key = lambda station: fuelprice_by_station[station].midpoint() ):
-        fp = fuelprice_by_station[station]
-        if fp.is_converged():
-            fuel_string = '%.2f' % fp.midpoint()
+        # ingest correlation data from file or URL
+        if args:
+            with open(args[0]) as f:
+                stations_json = json.load(f)
         else:
-            guess = fp.guess()
-            if guess:
-                fuel_string = '%.2f (guessed by frequency)' % guess
+            stations_json = taunet.get_tracker_json()
+
+        # read all entries
+        entries = read_items(stations_json)
+        if not entries:
+            print("Not enough data, giving up")
+            sys.exit(1)
+        # each entry has: slug, ItemPrice, Vendor, Station, System, FuelPrice, FuelPriceCoefficient
+
+        # map stations to short names
+        shortname_by_station = { info['station']['name'] : info['station']['short'] for info in stations_json }
+
+        # get list of stations (having vendors), and entries available per station
+        stations = set( e['Station'] for e in entries)
+        nstations = len(stations)
+        entries_by_station = entries_by_key(entries, 'Station')
+
+        # for each slug, get the list of stations where it is available
+        available_on_station_by_slug = {}
+        for entry in entries:
+            slug = entry['slug']
+            station = entry['Station']
+            if not slug in available_on_station_by_slug:
+                available_on_station_by_slug[slug] = set()
+            available_on_station_by_slug[slug].add(station)
+
+        # remove slugs with ambiguous pricing, per station
+        cleaned_entries_by_station = {}
+        for station in stations:
+            debug_print("STATION =", station)
+            # collect vendor entries for this station
+            station_entries = entries_by_station[station]
+            # get items available on this station
+            station_entries_by_slug = entries_by_key(station_entries, 'slug')
+            debug_print("  items available: ", len(station_entries_by_slug))
+            cleaned_entries = {}
+            for slug, slug_entries in station_entries_by_slug.items():
+                if len(slug_entries) != 1:
+                    prices = set(e['ItemPrice'] for e in slug_entries)
+                    if len(prices) != 1:
+                        debug_print("  ambiguous pricing: discarding '%s' on %s" % (slug, station))
+                        continue
+                cleaned_entries[slug] = slug_entries
+            cleaned_entries_by_station[station] = cleaned_entries
+            debug_print("  items left: ", len(cleaned_entries))
+
+        # plan which items to look up
+        plan = plan_lookups(cleaned_entries_by_station, available_on_station_by_slug)
+        station_order, slugs_by_station = apply_plan(plan, cleaned_entries_by_station, available_on_station_by_slug)
+        planned_slug_by_station = { station: slug for slug, resolved in plan for station in resolved }
+        debug_print("planned %d item lookups for %d/%d stations"
+            % (len(plan), sum(len(resolved) for slug,resolved in plan), nstations))
+
+        # compare with looking up items greedily, and with choosing them without a plan,
+        # using the recorded prices as prediction, and follow the cheapest (the plan on a tie)
+        predicted_ranges = predict_price_ranges(entries)
+        likelihoods = rank_likelihoods(cleaned_entries_by_station, available_on_station_by_slug)
+        greedy_slugs_by_station = { station: greedy_slug_order(cleaned_entries_by_station[station], available_on_station_by_slug)
+                                    for station in stations }
+        lookup_strategies = [
+            ('with plan', (station_order, slugs_by_station, planned_slug_by_station, False)),
+            ('greedy', (list(stations), greedy_slugs_by_station, {}, True)),
+            ('chosen without plan', (list(stations), greedy_slugs_by_station, {}, False)),
+        ]
+        predicted_lookups = {}
+        for name, (order, slugs, planned, in_order) in lookup_strategies:
+            predicted_lookups[name] = count_lookups(order, slugs, planned, predicted_ranges, likelihoods,
+                cleaned_entries_by_station, entries_by_station, available_on_station_by_slug, in_order)
+        debug_print("predicted phase 1 lookups: %d with plan, %d greedy, %d chosen without plan"
+            % tuple(predicted_lookups[name] for name, strategy in lookup_strategies))
+        name, (order, slugs, planned, in_order) = min(lookup_strategies, key = lambda s: predicted_lookups[s[0]])
+        debug_print("looking up the items %s" % name)
+
+        # run over all stations
+        debug_print("### PHASE 1 ###")
+        fuelprice_by_station, considered_slugs_by_station, nconverged = phase1(
+            order, slugs, planned, lambda slug: get_minmax(cache, slug),
+            predicted_ranges, likelihoods,
+            cleaned_entries_by_station, entries_by_station, available_on_station_by_slug, in_order)
+
+        # run over all stations again, if necessary multiple times
+        iteration = 0
+        while nconverged < nstations:
+            iteration += 1
+            debug_print("### PHASE 2 # Iteration=%d ###" % iteration)
+            prev_nconverged = nconverged # to check progress
+
+            for station in stations:
+                # skip station if converged
+                if fuelprice_by_station[station].is_converged(): continue
+
+                debug_print("STATION =", station)
+
+                # get the current interval
+                fuelprice_interval = fuelprice_by_station[station]
+
+                for slug in considered_slugs_by_station[station]:
+                    debug_print("  slug =", slug)
+                    itemprice_min, itemprice_max = get_minmax(cache, slug)
+                    debug_print("    itemprice range = %.2f — %.2f" % (itemprice_min, itemprice_max))
+
+                    fuelprice = pin_fuelprice(station, slug, itemprice_min, itemprice_max, fuelprice_interval,
+                        fuelprice_by_station, entries_by_station, available_on_station_by_slug)
+                    if (not fuelprice): continue # move on to next item
+                    debug_print("  => fuelprice = %s" % fuelprice)
+
+                    # store result
+                    fuelprice_interval.update(fuelprice.min, fuelprice.max)
+                    if fuelprice_interval.is_converged():
+                        nconverged += 1
+                        # don't need to consider more items
+                        break
+        
+            # check progress
+            if nconverged == prev_nconverged:
+                # no :(
+                debug_print("no progress, giving up")
+                break
+
+        debug_print("resolved %d/%d stations after %d iterations" % (nconverged, nstations, iteration))
+        refresh_beliefs(fuelprice_by_station, considered_slugs_by_station, lambda slug: get_minmax(cache, slug),
+            likelihoods, cleaned_entries_by_station, available_on_station_by_slug)
+        debug_print("item lookups: %d" % len(looked_up_slugs))
+
+        # print result
+        # sort stations by estimated fuelprice
+        def sort_key(station):
+            estimate, confidence = fuelprice_by_station[station].estimate()
+            return math.inf if estimate is None else estimate
+        for station in sorted(stations, key = sort_key):
+            fp = fuelprice_by_station[station]
+            estimate, confidence = fp.estimate()
+            if fp.is_converged():
+                fuel_string = '%.2f' % estimate
+            elif estimate is not None:
+                fuel_string = '%.2f (%.1f%% confidence, within %s)' % (estimate, 100 * confidence, fp)
             else:
                 fuel_string = str(fp)
-            
-        print( "%-12s%s" % ( shortname_by_station[station], fuel_string))
+            print( "%-12s%s" % ( shortname_by_station[station], fuel_string))
 
+        if outfile:
+            write_result(outfile, fuelprice_by_station, shortname_by_station)
@@ -1,10 +1,11 @@
 #!/usr/bin/env python3
 
-import urllib.request
-import json
 import csv
 import sys
 
+import strategy_analysis
+import taunet
+
 
 def read_items(jsondata):
     """Read the vendor entries from the given JSON data."""
@@ -60,30 +61,52 @@ def remove_ambiguous(slug_entries):
     return cleaned_entries
 
 
+MAX_CANDIDATES = 4
+
+
 class Strategy:
+    """The ranked candidate items for estimating the fuel price of one station.
+    All candidates share the same level; the most expensive item comes first."""
     def __init__(self, station):
         self.station = station
-        self.slug = None
-        self.fpc  = None
-        self.parent = None
-        self.parentfpc = 0.0
+        self.candidates = []
         self.level = 0
-    def update(self, slug, fpc, parent=None, parentfpc=0.0, level=None):
+    def update(self, entry, parent_entry=None, level=None):
+        """Add the entry as candidate, comparing with parent_entry (for the same
+        item on the parent station) if given."""
         if level is None:
             level = self.level
-        if (level < self.level) or (not self.fpc) or (fpc > self.fpc):
-            self.slug = slug
-            self.fpc = fpc
-            self.parent = parent
-            self.parentfpc = parentfpc
-            self.level = level
+        if self.candidates and level > self.level:
+            return
+        if level < self.level:
+            self.candidates = []
+        self.level = level
+        self.candidates.append({
+            'slug': entry['slug'],
+            'fpc': float(entry['FuelPriceCoefficient']),
+            'entry': entry,
+            'parent': parent_entry['Station'] if parent_entry else None,
+            'parent_entry': parent_entry
+            })
+        self.candidates.sort(key = lambda c: c['fpc'], reverse=True)
+        del self.candidates[MAX_CANDIDATES:]
+    # the best candidate
+    @property
+    def slug(self):
+        return self.candidates[0]['slug']
+    @property
+    def fpc(self):
+        return self.candidates[0]['fpc']
+    @property
+    def parent(self):
+        return self.candidates[0]['parent']
 
 
 if __name__ == '__main__':
+    # --report: also analyse which items and stations the estimates hinge on
+    report = '--report' in sys.argv[1:]
     # read all entries
-    url = "https://tracker.tauguide.de/v1/special/fuel-vendor-correlation"
-    with urllib.request.urlopen(url) as response:
-        stations_json = json.load(response)
+    stations_json = taunet.get_tracker_json()
     entries = read_items(stations_json)
     if not entries:
         print("Not enough data, giving up")
@@ -106,10 +129,9 @@ if __name__ == '__main__':
     for slug in unique_slugs:
         entry = slug_entries[slug][0]
         station = entry['Station']
-        fpc = entry['FuelPriceCoefficient']
         if not station in strategies: strategies[station] = Strategy(station)
         strat = strategies[station]
-        strat.update(slug, fpc)
+        strat.update(entry)
     print("  Resolved stations:", len(strategies))
 
     # extend strategy via dual_slugs
@@ -142,58 +164,69 @@ if __name__ == '__main__':
                 if not other_station in strategies: continue # nope
                 # YES!
                 other_level = strategies[other_station].level
-                other_fpc = float(other_entry['FuelPriceCoefficient'])
                 entry = sse[slug][0]
-                fpc = float(entry['FuelPriceCoefficient'])
                 if best_strategy is None:
-                    # first hit, just store it
                     best_strategy = Strategy(station)
-                    best_strategy.update(slug, fpc, other_station, other_fpc, other_level+1)
-                else:
-                    # see if this strategy is better
-                    # first, prefer strategies with smaller level
-                    if other_level+1 > best_strategy.level: continue
-                    if other_level+1 < best_strategy.level:
-                        best_strategy.update(slug, fpc, other_station, other_fpc, other_level+1)
-                    else:
-                        # same level, prefer more expensive item
-                        best_strategy.update(slug, fpc, other_station, other_fpc)
+                # keeps only the candidates with the smallest level,
+                # ranked by price
+                best_strategy.update(entry, other_entry, other_level+1)
             # did we find any item for strategy?
             if best_strategy is None: continue # nope
             # yes, store the strategy
             strategies[station] = best_strategy
 
         print("  Resolved stations:", len(strategies))
-        # any progress on strategies?
+        # finished? (possibly by the unique items alone)
         nresolved = len(strategies)
+        if nresolved == len(stations):
+            break
+        # any progress on strategies?
         if nresolved == nresolved_prev:
             # no :(
             print("No progress, giving up")
             sys.exit(1)
-        # finished?
-        if nresolved == len(stations):
-            break
 
-    # all done, print result
+    # all done, find fallbacks for when a station's candidates fail
+    # and print result
+    options = strategy_analysis.station_options(slug_entries, unique_slugs, dual_slugs)
+    order = list(strategies)
+    planned = {}
     maxlevel = max(s.level for k,s in strategies.items())
     result = []
     for level in range(0,maxlevel+1):
         print("Phase", level)
         for station,strat in strategies.items():
             if strat.level != level : continue
-            print("  %s, slug=%s fpc=%f, compare with %s" % (station, strat.slug, strat.fpc, strat.parent))
-            result.append({
-                'Station': station,
-                'slug': strat.slug,
-                'FuelPriceCoefficient': strat.fpc,
-                'OtherStation': strat.parent,
-                'OtherFPC': strat.parentfpc
-                })
+            fallbacks = strategy_analysis.fallbacks(station, options, order, strat.candidates)
+            print("  %s, slug=%s fpc=%f, compare with %s (%d alternatives, %d fallbacks)"
+                % (station, strat.slug, strat.fpc, strat.parent, len(strat.candidates)-1, len(fallbacks)))
+            # one line per candidate, in order of preference, then the fallbacks,
+            # with the observed prices, so that the FPC can be bounded exactly
+            candidates = [ (cand['entry'], cand['parent_entry']) for cand in strat.candidates ] + fallbacks
+            planned[station] = candidates
+            for rank,(entry,other_entry) in enumerate(candidates):
+                other_entry = other_entry or {}
+                result.append({
+                    'Station': station,
+                    'Rank': rank,
+                    'slug': entry['slug'],
+                    'FuelPriceCoefficient': float(entry['FuelPriceCoefficient']),
+                    'ItemPrice': entry['ItemPrice'],
+                    'FuelPrice': entry['FuelPrice'],
+                    'OtherStation': other_entry.get('Station'),
+                    'OtherFPC': other_entry.get('FuelPriceCoefficient', 0.0),
+                    'OtherItemPrice': other_entry.get('ItemPrice'),
+                    'OtherFuelPrice': other_entry.get('FuelPrice')
+                    })
     with open("fuel-price-strategy.csv", "w") as fp:
-        fieldnames = ['Station', 'slug', 'FuelPriceCoefficient', 'OtherStation', 'OtherFPC']
+        fieldnames = ['Station', 'Rank', 'slug', 'FuelPriceCoefficient', 'ItemPrice', 'FuelPrice',
+                      'OtherStation', 'OtherFPC', 'OtherItemPrice', 'OtherFuelPrice']
         cw = csv.DictWriter(fp, fieldnames)
         cw.writeheader()
         for line in result:
             cw.writerow(line)
 
-
+    if report:
+        strategy_options = { station: [ (cand['entry'], cand['parent_entry']) for cand in strat.candidates ]
+                             for station,strat in strategies.items() }
+        strategy_analysis.write_report("fuel-price-sensitivity.csv", strategy_options, planned, options)
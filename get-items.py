@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import requests
+import taunet
+from item_archive import ItemArchive, is_archive, update_archive
+
+ITEM_DIR = 'items'
+
+
+def download(slug):
+    """The item page, or None on failure."""
+    try:
+        response = taunet.get_item_page(slug)
+    except requests.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+    return response.content
+
+
+def fetch(slug):
+    """Download the item page into the items directory.  Returns True on success."""
+    content = download(slug)
+    if content is None:
+        return False
+    # write to a temporary file first, so a failed download leaves nothing behind
+    fname = os.path.join(ITEM_DIR, slug + '.html')
+    with open(fname + '.part', 'wb') as fp:
+        fp.write(content)
+    os.replace(fname + '.part', fname)
+    return True
+
+
+def fetch_into(pages, slug):
+    """Download the item page into pages (for the archive).  Returns True on success."""
+    content = download(slug)
+    if content is None:
+        return False
+    pages[slug] = content
+    return True
+
+
+if __name__ == '__main__':
+    # -j N: number of concurrent downloads (the rate limit still applies)
+    # --archive FILE: add the pages to an item archive (see item-archive.py) instead of the items directory
+    args = sys.argv[1:]
+    nworkers = int(args[args.index('-j') + 1]) if '-j' in args else 4
+    archivefile = args[args.index('--archive') + 1] if '--archive' in args else None
+    if archivefile:
+        archived = set()
+        if is_archive(archivefile):
+            with ItemArchive(archivefile) as archive:
+                archived = set(archive.slugs())
+        have = lambda slug: slug in archived
+    else:
+        os.makedirs(ITEM_DIR, exist_ok=True)
+        have = lambda slug: os.path.exists(os.path.join(ITEM_DIR, slug + '.html'))
+    slugs = []
+    seen = set()
+    for line in sys.stdin:
+        slug = line.strip()
+        if slug and not slug in seen and not have(slug):
+            slugs.append(slug)
+            seen.add(slug)
+    pages = {}
+    try:
+        with ThreadPoolExecutor(max_workers=nworkers) as executor:
+            for slug, ok in zip(slugs, executor.map(partial(fetch_into, pages) if archivefile else fetch, slugs)):
+                if ok:
+                    print(slug, flush=True)
+                else:
+                    sys.stderr.write("FAILED: %s\n" % slug)
+    finally:
+        # also keep what was downloaded before an interruption
+        if pages:
+            update_archive(archivefile, pages, pages.__getitem__)
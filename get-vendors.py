@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+import csv
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+import taunet
+from vendor_pages import csv_writer, parse_vendor_page, write_fuel_price
+
+STATION_LIST = 'vendor-urls.csv'
+
+
+def read_station_list(fname):
+    """The vendor pages to fetch, from a CSV file with the columns System,
+    Station, URL (one row per vendor page, relative to the game site or
+    absolute) and optionally FuelPrice."""
+    with open(fname) as fp:
+        return list(csv.DictReader(fp))
+
+
+def fuel_prices(pages):
+    """The fuel price of each (system, station): as given in the station list,
+    or else the current one from the Tau Tracker service."""
+    fuelprices = {}
+    for page in pages:
+        if page.get('FuelPrice'):
+            fuelprices[(page['System'], page['Station'])] = page['FuelPrice']
+    if any((page['System'], page['Station']) not in fuelprices for page in pages):
+        for station_info in taunet.get_tracker_json():
+            key = (station_info['station']['system'], station_info['station']['name'])
+            if not key in fuelprices:
+                fuelprices[key] = str(station_info['fuel_price_per_g'])
+    return fuelprices
+
+
+def vendor_file(page):
+    """Where the page is saved: <system>/<station>/<vendor>.html"""
+    name = urlsplit(page['URL']).path.rstrip('/').split('/')[-1]
+    return os.path.join(page['System'], page['Station'], name + '.html')
+
+
+def fetch(page):
+    """The content of the vendor page, or None on failure."""
+    try:
+        response = taunet.get_page(page['URL'])
+    except requests.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+    return response.content
+
+
+if __name__ == '__main__':
+    # -j N: number of concurrent downloads (the rate limit still applies)
+    # --csv: write the items straight into tau-vendors.csv instead of saving the pages
+    args = sys.argv[1:]
+    nworkers = int(args.pop(args.index('-j') + 1)) if '-j' in args else 4
+    stream = '--csv' in args
+    args = [ a for a in args if not a in ('-j', '--csv') ]
+    pages = read_station_list(args[0] if args else STATION_LIST)
+
+    fuelprices = fuel_prices(pages)
+    for page in pages:
+        if not (page['System'], page['Station']) in fuelprices:
+            sys.stderr.write("no fuel price for %s, skipping %s\n" % (page['Station'], page['URL']))
+    pages = [ page for page in pages if (page['System'], page['Station']) in fuelprices ]
+    if not stream:
+        # stations with all pages saved are kept, so an interrupted run can be continued;
+        # the others are fetched again, as their saved pages go with the earlier fuel price
+        incomplete = set((page['System'], page['Station']) for page in pages
+                         if not os.path.exists(vendor_file(page)))
+        pages = [ page for page in pages if (page['System'], page['Station']) in incomplete ]
+        for system, station in incomplete:
+            os.makedirs(os.path.join(system, station), exist_ok=True)
+            write_fuel_price(os.path.join(system, station), fuelprices[(system, station)])
+    else:
+        # written to a temporary file, which replaces tau-vendors.csv only if all pages succeed
+        cf = open("tau-vendors.csv.part", "w")
+        cw = csv_writer(cf)
+
+    failed = False
+    with ThreadPoolExecutor(max_workers=nworkers) as executor:
+        for page, content in zip(pages, executor.map(fetch, pages)):
+            if content is None:
+                sys.stderr.write("FAILED: %s\n" % page['URL'])
+                failed = True
+                continue
+            if stream:
+                fuelprice = fuelprices[(page['System'], page['Station'])]
+                html = content.decode('utf-8', errors='replace')
+                for item in parse_vendor_page(html, fuelprice, page['System'], page['Station']):
+                    cw.writerow(item)
+                cf.flush()
+            else:
+                # write to a temporary file first, so a failed download leaves nothing behind
+                fname = vendor_file(page)
+                with open(fname + '.part', 'wb') as fp:
+                    fp.write(content)
+                os.replace(fname + '.part', fname)
+            print(page['URL'], flush=True)
+    if stream:
+        cf.close()
+        if failed:
+            sys.stderr.write("not all pages fetched, tau-vendors.csv is unchanged (see tau-vendors.csv.part)\n")
+            sys.exit(1)
+        os.replace("tau-vendors.csv.part", "tau-vendors.csv")
@@ -0,0 +1,172 @@
+"""
+Interval arithmetic for Tau Station prices.
+
+The site shows item prices rounded to 2 decimals and fuel prices rounded to
+1 decimal, so an observed price stands for all the values that round to it.
+Carrying these intervals through the calculations gives guaranteed bounds, so
+that results can be compared exactly instead of with some ad-hoc tolerance.
+
+All prices and fuel price coefficients are positive, which keeps
+multiplication and division simple.
+"""
+
+import math
+
+# number of decimals shown for item prices and fuel prices
+PRICE_DECIMALS = 2
+FUELPRICE_DECIMALS = 1
+# slack for floating point errors
+EPSILON = 1e-9
+# a fuel price is considered known once its interval is shorter than this
+RESOLUTION = 0.5
+
+
+class Interval:
+    def __init__(self, min=-math.inf, max=math.inf):
+        self.min = min
+        self.max = max
+
+    @classmethod
+    def rounded(cls, price, decimals=PRICE_DECIMALS):
+        """All values that are shown as the given price."""
+        half = 0.5 * 10**(-decimals)
+        return cls(price - half - EPSILON, price + half + EPSILON)
+
+    def length(self):
+        return (self.max - self.min)
+    def midpoint(self):
+        return 0.5 * (self.min + self.max)
+    def is_empty(self):
+        return self.min > self.max
+    def is_bounded(self):
+        return math.isfinite(self.min) and math.isfinite(self.max)
+    def is_converged(self):
+        return self.length() < RESOLUTION
+    def contains(self, a):
+        return (a >= self.min) and (a <= self.max)
+
+    def intersect(self, other):
+        return Interval(max(self.min, other.min), min(self.max, other.max))
+    def overlaps(self, other):
+        return not self.intersect(other).is_empty()
+
+    def __mul__(self, other):
+        if not isinstance(other, Interval):
+            other = Interval(other, other)
+        return Interval(self.min * other.min, self.max * other.max)
+    __rmul__ = __mul__
+    def __truediv__(self, other):
+        if not isinstance(other, Interval):
+            other = Interval(other, other)
+        return Interval(self.min / other.max, self.max / other.min)
+
+    def __str__(self):
+        return "[%.2f, %.2f]" % (self.min, self.max)
+
+
+def price_range(mn, mx):
+    """All values covered by a price range shown as mn - mx."""
+    return Interval(Interval.rounded(mn).min, Interval.rounded(mx).max)
+
+
+def fuelprice_interval(fuelprice, error=None):
+    """All values an observed fuel price stands for, or, with an error (for an
+    estimated fuel price, see vendor-anomalies.py), the values within it."""
+    if error in (None, ''):
+        return Interval.rounded(float(fuelprice), FUELPRICE_DECIMALS)
+    return Interval(float(fuelprice) - float(error), float(fuelprice) + float(error))
+
+
+def fpc_interval(itemprice, fuelprice, fuelprice_error=None):
+    """The fuel price coefficient of an item, given its observed price
+    and the station's observed (or estimated) fuel price."""
+    return Interval.rounded(float(itemprice)) / fuelprice_interval(fuelprice, fuelprice_error)
+
+
+# at most this many pieces are kept in a weighted interval set,
+# and none that are less likely than this
+MAX_PIECES = 8
+MIN_WEIGHT = 1e-6
+
+
+class WeightedIntervals:
+    """
+    A compact probability distribution: a few intervals (pieces), each with a
+    weight, and the value uniformly distributed within a piece.  Without any
+    pieces, nothing is known.
+    """
+    def __init__(self, pieces=()):
+        self.pieces = [ (iv, w) for iv, w in pieces if w > 0 and not iv.is_empty() ]
+        self.normalize()
+
+    def normalize(self):
+        # keep only the most likely pieces
+        if len(self.pieces) > MAX_PIECES:
+            self.pieces.sort(key = lambda p: -p[1])
+            del self.pieces[MAX_PIECES:]
+        total = sum(w for iv, w in self.pieces)
+        self.pieces = [ (iv, w / total) for iv, w in self.pieces if w > MIN_WEIGHT * total ] if total > 0 else []
+        total = sum(w for iv, w in self.pieces)
+        self.pieces = [ (iv, w / total) for iv, w in self.pieces ]
+
+    def is_known(self):
+        return bool(self.pieces)
+
+    def restrict(self, interval):
+        """The distribution, given that the value is inside the interval."""
+        pieces = []
+        for iv, w in self.pieces:
+            part = iv.intersect(interval)
+            if part.is_empty(): continue
+            pieces.append((part, w * max(part.length(), EPSILON) / max(iv.length(), EPSILON)))
+        return WeightedIntervals(pieces)
+
+    def combine(self, other):
+        """The distribution given the evidence of both (assumed independent).
+        If they contradict each other, the other one is taken."""
+        if not self.is_known(): return other
+        if not other.is_known(): return self
+        pieces = []
+        for iv1, w1 in self.pieces:
+            for iv2, w2 in other.pieces:
+                part = iv1.intersect(iv2)
+                if part.is_empty(): continue
+                # product of the uniform densities over the overlap
+                overlap = max(part.length(), EPSILON)
+                pieces.append((part, w1 * w2 * overlap / (max(iv1.length(), EPSILON) * max(iv2.length(), EPSILON))))
+        combined = WeightedIntervals(pieces)
+        return combined if combined.is_known() else other
+
+    def bounds(self):
+        if not self.is_known(): return Interval()
+        return Interval(min(iv.min for iv, w in self.pieces), max(iv.max for iv, w in self.pieces))
+
+    def mean(self):
+        return sum(w * iv.midpoint() for iv, w in self.pieces)
+
+    def spread(self):
+        """The standard deviation, as measure of the uncertainty."""
+        if not self.is_known(): return math.inf
+        mean = self.mean()
+        var = sum(w * ((iv.midpoint() - mean)**2 + iv.length()**2 / 12.0) for iv, w in self.pieces)
+        return math.sqrt(max(var, 0.0))
+
+    def estimate(self):
+        """The most likely value (the middle of the most likely piece),
+        and the probability that the value is within RESOLUTION of it."""
+        if not self.is_known(): return (None, 0.0)
+        best, w = max(self.pieces, key = lambda p: p[1])
+        point = best.midpoint()
+        window = Interval(point - 0.5 * RESOLUTION, point + 0.5 * RESOLUTION)
+        return (point, self.probability(window))
+
+    def probability(self, interval):
+        total = 0.0
+        for iv, w in self.pieces:
+            part = iv.intersect(interval)
+            if part.is_empty(): continue
+            total += w * (1.0 if iv.length() <= EPSILON else part.length() / iv.length())
+        return min(total, 1.0)
+
+    def __str__(self):
+        return " | ".join("%s:%.2f" % (iv, w) for iv, w in self.pieces)
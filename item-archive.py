@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sys
+from glob import glob
+
+from item_archive import ItemArchive, update_archive
+
+ARCHIVE = 'items.archive'
+
+
+def read_file(fname):
+    with open(fname, 'rb') as fp:
+        return fp.read()
+
+
+def pack(archivefile, itemdir):
+    """Add the item pages in itemdir to the archive (replacing the archived
+    pages of the same slugs)."""
+    files = { os.path.basename(f)[:-5]: f for f in glob(os.path.join(itemdir, '*.html')) }
+    total = update_archive(archivefile, files, lambda slug: read_file(files[slug]))
+    return len(files), total
+
+
+def unpack(archivefile, itemdir):
+    """Write the archived pages as .html files into itemdir."""
+    os.makedirs(itemdir, exist_ok=True)
+    with ItemArchive(archivefile) as archive:
+        for slug, page in archive.pages():
+            with open(os.path.join(itemdir, slug + '.html'), 'wb') as fp:
+                fp.write(page)
+        return len(archive)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Single-file archive of the item pages.")
+    parser.add_argument('-f', '--file', default=ARCHIVE, help="archive file (default: %(default)s)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    cmd = commands.add_parser('pack', help="add the .html files in ITEMDIR to the archive")
+    cmd.add_argument('itemdir', nargs='?', default='items')
+    cmd = commands.add_parser('unpack', help="write the archived pages as .html files into ITEMDIR")
+    cmd.add_argument('itemdir', nargs='?', default='items')
+    commands.add_parser('list', help="print the archived slugs")
+    cmd = commands.add_parser('show', help="print the page of SLUG")
+    cmd.add_argument('slug')
+    commands.add_parser('stats', help="number of pages and sizes")
+    args = parser.parse_args()
+
+    if args.command == 'pack':
+        npacked, total = pack(args.file, args.itemdir)
+        print("packed %d pages, %d in %s" % (npacked, total, args.file))
+    elif args.command == 'unpack':
+        print("unpacked %d pages into %s" % (unpack(args.file, args.itemdir), args.itemdir))
+    else:
+        with ItemArchive(args.file) as archive:
+            if args.command == 'list':
+                for slug in archive.slugs():
+                    print(slug)
+            elif args.command == 'show':
+                page = archive.get(args.slug)
+                if page is None:
+                    sys.exit("not in the archive: " + args.slug)
+                sys.stdout.buffer.write(page)
+            elif args.command == 'stats':
+                size = sum(len(page) for slug, page in archive.pages())
+                print("pages:        %d" % len(archive))
+                print("page size:    %d" % size)
+                print("archive size: %d" % os.path.getsize(args.file))
+                print("dictionary:   %d" % len(archive.zdict))
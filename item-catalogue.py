@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+import argparse
+import os.path
+import sqlite3
+import sys
+from datetime import date
+from glob import glob
+
+from item_archive import ItemArchive, is_archive
+
+CATALOGUE = 'item-catalogue.sqlite'
+
+
+def open_catalogue(fname):
+    db = sqlite3.connect(fname)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS slugs (
+            slug       TEXT NOT NULL,
+            source     TEXT NOT NULL,
+            detail     TEXT,
+            first_seen TEXT NOT NULL,
+            last_seen  TEXT NOT NULL,
+            PRIMARY KEY (source, slug)
+        ) WITHOUT ROWID""")
+    db.execute("CREATE INDEX IF NOT EXISTS slugs_by_slug ON slugs (slug)")
+    return db
+
+
+def read_slugs(fp):
+    """Read slugs from the given file, one per line.
+    Anything after the slug (separated by a tab) is kept as detail,
+    e.g. the changelog post mentioning the item."""
+    slugs = {}
+    for line in fp:
+        line = line.rstrip('\n')
+        if not line.strip(): continue
+        slug, _, detail = line.partition('\t')
+        slug = slug.strip()
+        if slug and not slug in slugs:
+            slugs[slug] = detail or None
+    return slugs
+
+
+def add_slugs(db, source, slugs, replace=False):
+    """Record that the source knows the slugs (a dict slug -> detail).
+    With replace, slugs no longer known to the source are removed."""
+    today = str(date.today())
+    with db:
+        db.executemany("""
+            INSERT INTO slugs (slug, source, detail, first_seen, last_seen) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (source, slug) DO UPDATE SET
+                last_seen = excluded.last_seen,
+                detail = COALESCE(excluded.detail, detail)""",
+            ((slug, source, detail, today, today) for slug, detail in slugs.items()))
+        if replace:
+            db.execute("CREATE TEMP TABLE IF NOT EXISTS current (slug TEXT PRIMARY KEY)")
+            db.execute("DELETE FROM current")
+            db.executemany("INSERT INTO current VALUES (?)", ((slug,) for slug in slugs))
+            db.execute("DELETE FROM slugs WHERE source = ? AND slug NOT IN (SELECT slug FROM current)", (source,))
+
+
+def scan_items(itemdir):
+    """The slugs for which there is a downloaded item page (in the directory
+    or the item archive)."""
+    if is_archive(itemdir):
+        with ItemArchive(itemdir) as archive:
+            return { slug: None for slug in archive.slugs() }
+    return { os.path.basename(f)[:-5]: None for f in glob(os.path.join(itemdir, '*.html')) }
+
+
+def select_slugs(db, sources, exclude=()):
+    """Slugs known to any of the sources, but not to any of the excluded sources."""
+    query = "SELECT DISTINCT slug FROM slugs"
+    params = []
+    if sources:
+        query += " WHERE source IN (%s)" % ",".join("?" * len(sources))
+        params += sources
+    if exclude:
+        query += " EXCEPT SELECT slug FROM slugs WHERE source IN (%s)" % ",".join("?" * len(exclude))
+        params += exclude
+    query += " ORDER BY slug"
+    return [ row[0] for row in db.execute(query, params) ]
+
+
+def show_slug(db, slug):
+    rows = db.execute("""
+        SELECT source, first_seen, last_seen, detail FROM slugs
+        WHERE slug = ? ORDER BY source""", (slug,))
+    for source, first_seen, last_seen, detail in rows:
+        print("%-12s %s -- %s  %s" % (source, first_seen, last_seen, detail or ''))
+
+
+def show_stats(db):
+    rows = db.execute("""
+        SELECT source, COUNT(*), MIN(first_seen), MAX(last_seen) FROM slugs
+        GROUP BY source ORDER BY source""")
+    for source, count, first_seen, last_seen in rows:
+        print("%-12s %6d slugs, seen %s -- %s" % (source, count, first_seen, last_seen))
+    total = db.execute("SELECT COUNT(DISTINCT slug) FROM slugs").fetchone()[0]
+    print("%-12s %6d slugs" % ("total", total))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Catalogue of item slugs and the sources that know them.")
+    parser.add_argument('-f', '--file', default=CATALOGUE, help="catalogue file (default: %(default)s)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    cmd = commands.add_parser('add', help="add slugs read from stdin (one per line) for SOURCE")
+    cmd.add_argument('source')
+    cmd.add_argument('--replace', action='store_true', help="forget slugs of SOURCE that are not on stdin")
+    cmd = commands.add_parser('scan', help="record the downloaded item pages (in ITEMDIR or an item archive) as source 'items'")
+    cmd.add_argument('itemdir', nargs='?', default='items')
+    cmd = commands.add_parser('list', help="print slugs known to any of the SOURCEs")
+    cmd.add_argument('sources', nargs='*', metavar='SOURCE')
+    cmd.add_argument('--not', dest='exclude', action='append', default=[], metavar='SOURCE',
+                     help="leave out slugs known to this source")
+    cmd = commands.add_parser('show', help="show which sources know SLUG")
+    cmd.add_argument('slug')
+    commands.add_parser('stats', help="number of slugs per source")
+    args = parser.parse_args()
+
+    db = open_catalogue(args.file)
+    if args.command == 'add':
+        add_slugs(db, args.source, read_slugs(sys.stdin), args.replace)
+    elif args.command == 'scan':
+        add_slugs(db, 'items', scan_items(args.itemdir), replace=True)
+    elif args.command == 'list':
+        for slug in select_slugs(db, args.sources, args.exclude):
+            print(slug)
+    elif args.command == 'show':
+        show_slug(db, args.slug)
+    elif args.command == 'stats':
+        show_stats(db)
+    db.close()
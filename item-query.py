@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import operator
+import re
+import sys
+
+import item_records
+import item_tables
+
+OPERATORS = {
+    '<=': operator.le, '>=': operator.ge, '!=': operator.ne,
+    '<': operator.lt, '>': operator.gt, '=': operator.eq
+}
+
+
+def parse_condition(text):
+    """Parse a condition like 'weight<2.5' into (field, operator, value)."""
+    match = re.match(r'\s*([\w-]+)\s*(<=|>=|!=|<|>|=)\s*(.*?)\s*$', text)
+    if not match:
+        raise argparse.ArgumentTypeError("invalid condition: %s" % text)
+    field, op, value = match.groups()
+    return (field, OPERATORS[op], value)
+
+
+YESNO = { 'Yes': True, 'True': True, 'No': False, 'False': False }
+
+
+def convert_value(value, typ):
+    """The condition value as the column's type; raises ValueError if it isn't one.
+    Yes/No columns also understand True and False."""
+    if typ is bool:
+        if not value in YESNO:
+            raise ValueError("expected Yes or No")
+        return YESNO[value]
+    if typ is str:
+        return value
+    return item_records.parse_number(value)
+
+
+def matches(tables, record, conditions):
+    for field, op, value in conditions:
+        v = item_tables.value(tables, record, field)
+        if v is None: return False
+        if not op(v, value): return False
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Query the item catalogue made by items-to-csv.py.",
+        epilog="Besides the CSV columns, the fields damage, damage_per_kg, and (from the cheapest "
+               "vendor offer in credits) price, vendor, station and price_per_damage can be used.")
+    parser.add_argument('-t', '--type', help="item category, e.g. Weapon")
+    parser.add_argument('--slug')
+    parser.add_argument('--tier', type=int)
+    parser.add_argument('--rarity')
+    parser.add_argument('-w', '--where', type=parse_condition, action='append', default=[],
+                        metavar='CONDITION', help="e.g. 'weight<2.5' (can be repeated)")
+    parser.add_argument('-s', '--sort', metavar='FIELD', help="sort by FIELD, largest first")
+    parser.add_argument('--asc', action='store_true', help="sort smallest first")
+    parser.add_argument('-n', '--top', type=int, metavar='K', help="only the first K items")
+    parser.add_argument('-f', '--fields', default='slug,name,tier,rarity',
+                        help="comma-separated fields to print (default: %(default)s)")
+    parser.add_argument('--items', default='items', help="directory with the CSV files")
+    parser.add_argument('--vendors', default='tau-vendors.csv')
+    parser.add_argument('--cache', default='item-tables.cache')
+    args = parser.parse_args()
+
+    # check the field names, and convert the condition values to the column types
+    types = item_tables.field_types(args.type)
+    def check_field(field):
+        if not field in types:
+            parser.error("unknown field: %s (fields: %s)" % (field, ", ".join(sorted(types))))
+    conditions = []
+    for field, op, value in args.where:
+        check_field(field)
+        try:
+            conditions.append((field, op, convert_value(value, types[field])))
+        except ValueError as e:
+            parser.error("invalid value for %s: %s (%s)" % (field, value, e))
+    fields = args.fields.split(',')
+    if args.sort and not args.sort in fields:
+        fields.append(args.sort)
+    for field in fields:
+        check_field(field)
+
+    tables = item_tables.load(args.items, args.vendors, args.cache)
+    # indexed lookups first, then the remaining conditions
+    criteria = {}
+    for attr in ('slug', 'tier', 'rarity'):
+        if getattr(args, attr) is not None:
+            criteria[attr] = getattr(args, attr)
+    records = tables.table(args.type).select(**criteria)
+    if conditions:
+        records = [ r for r in records if matches(tables, r, conditions) ]
+    if args.sort:
+        records = item_tables.top(tables, records, args.sort, args.top, reverse=not args.asc)
+    elif args.top:
+        records = records[:args.top]
+
+    cw = csv.writer(sys.stdout)
+    cw.writerow(fields)
+    for record in records:
+        cw.writerow([ item_records.format_value(item_tables.value(tables, record, field)) for field in fields ])
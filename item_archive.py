@@ -0,0 +1,262 @@
+"""
+A single-file archive of item pages, as an alternative to one .html file per
+slug in the items directory.
+
+Each page is compressed on its own, so any page can be read without the
+others, with a preset dictionary (zlib's zdict) made of the lines that most
+pages share (the site's header, navigation and footer), so the boilerplate
+is stored only once.  The file is read through mmap, and has a hash table of
+the slugs, so a lookup only touches the table slots and the page itself.
+
+Layout (little endian):
+
+    header   magic, version, count, zdict offset and length, table offset, slots
+    zdict    the preset dictionary
+    pages    per page: slug length (H), data length (I), slug, compressed data
+    table    slots * (slug hash (Q), page offset (Q)), offset 0 for an empty slot
+
+Pages added later are appended with the same dictionary, followed by a new
+table; the header is switched to it last, so that an interrupted update
+leaves the archive as it was.  The pages replaced and the old tables stay in
+the file as unused space until the archive is written anew.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import zlib
+
+MAGIC = b'TAUITEMS'
+VERSION = 1
+HEADER = struct.Struct('<8sIIQQQQ')
+RECORD = struct.Struct('<HI')
+SLOT = struct.Struct('<QQ')
+
+# zlib only looks back this far, so a longer dictionary is of no use
+ZDICT_SIZE = 32 * 1024
+# lines in at least this fraction of the pages go into the dictionary
+ZDICT_FRACTION = 0.5
+# the dictionary is made from (at most) this many pages
+ZDICT_SAMPLE = 200
+LEVEL = 9
+# the archive is written anew, with a new dictionary, if more than this fraction
+# of its pages would be new, or of its size unused
+REWRITE_FRACTION = 0.5
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def slug_hash(slug):
+    return int.from_bytes(hashlib.blake2b(slug.encode(), digest_size=8).digest(), 'little')
+
+
+def is_archive(fname):
+    if not os.path.isfile(fname):
+        return False
+    with open(fname, 'rb') as fp:
+        return fp.read(len(MAGIC)) == MAGIC
+
+
+class ItemArchive:
+    """Read access to an archive file; can be used like a read-only mapping
+    from slug to page (bytes)."""
+    def __init__(self, fname):
+        self.fname = fname
+        with open(fname, 'rb') as fp:
+            # an empty file can't be mapped
+            if os.fstat(fp.fileno()).st_size < HEADER.size:
+                raise ArchiveError("not an item archive: " + fname)
+            self.map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, zdict_off, zdict_len, self.table_off, self.nslots = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ArchiveError("not an item archive (version %d): %s" % (VERSION, fname))
+        self.zdict = self.map[zdict_off:zdict_off+zdict_len]
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def _record(self, offset):
+        slug_len, data_len = RECORD.unpack_from(self.map, offset)
+        start = offset + RECORD.size
+        slug = self.map[start:start+slug_len].decode()
+        return slug, start + slug_len, data_len
+
+    def _find(self, slug):
+        """The offset of the page's record, or None."""
+        h = slug_hash(slug)
+        i = h % self.nslots
+        while True:
+            slot_hash, offset = SLOT.unpack_from(self.map, self.table_off + i * SLOT.size)
+            if offset == 0:
+                return None
+            if slot_hash == h and self._record(offset)[0] == slug:
+                return offset
+            i = (i + 1) % self.nslots
+
+    def _page(self, offset):
+        slug, start, data_len = self._record(offset)
+        d = zlib.decompressobj(zdict=self.zdict)
+        return slug, d.decompress(self.map[start:start+data_len]) + d.flush()
+
+    def __contains__(self, slug):
+        return self._find(slug) is not None
+
+    def __getitem__(self, slug):
+        offset = self._find(slug)
+        if offset is None:
+            raise KeyError(slug)
+        return self._page(offset)[1]
+
+    def get(self, slug, default=None):
+        offset = self._find(slug)
+        return default if offset is None else self._page(offset)[1]
+
+    def _slots(self):
+        """The occupied slots of the table, as (slug hash, record offset)."""
+        slots = []
+        for i in range(self.nslots):
+            h, offset = SLOT.unpack_from(self.map, self.table_off + i * SLOT.size)
+            if offset:
+                slots.append((h, offset))
+        return slots
+
+    def _offsets(self):
+        """The record offsets, sorted by slug."""
+        records = sorted((self._record(offset)[0], offset) for h, offset in self._slots())
+        return [ offset for slug, offset in records ]
+
+    def slugs(self):
+        return [ self._record(offset)[0] for offset in self._offsets() ]
+
+    def pages(self):
+        """All (slug, page), sorted by slug."""
+        for offset in self._offsets():
+            yield self._page(offset)
+
+    def unused(self):
+        """The size of the replaced pages and old tables in the file."""
+        used = HEADER.size + len(self.zdict) + self.nslots * SLOT.size
+        for h, offset in self._slots():
+            slug, start, data_len = self._record(offset)
+            used += start + data_len - offset
+        return len(self.map) - used
+
+
+def build_zdict(pages):
+    """A preset dictionary from the lines shared by most of the pages: the most
+    common lines come last, where zlib finds them with the shortest distance."""
+    counts = {}
+    first_seen = {}
+    npages = 0
+    for page in pages:
+        npages += 1
+        seen = set()
+        for line in page.splitlines(keepends=True):
+            if line in seen: continue
+            seen.add(line)
+            counts[line] = counts.get(line, 0) + 1
+            first_seen.setdefault(line, len(first_seen))
+    threshold = max(2, ZDICT_FRACTION * npages)
+    shared = [ line for line, n in counts.items() if n >= threshold and line.strip() ]
+    # least common first, lines of equal count in the order they were seen
+    shared.sort(key = lambda line: (counts[line], first_seen[line]))
+    zdict = b''.join(shared)
+    return zdict[-ZDICT_SIZE:]
+
+
+def write_record(fp, slug, page, zdict):
+    """Write the compressed page at the end of fp; returns its offset."""
+    offset = fp.tell()
+    c = zlib.compressobj(LEVEL, zdict=zdict)
+    data = c.compress(page) + c.flush()
+    slug_bytes = slug.encode()
+    fp.write(RECORD.pack(len(slug_bytes), len(data)))
+    fp.write(slug_bytes)
+    fp.write(data)
+    return offset
+
+
+def write_table(fp, slots):
+    """Write the hash table for the (slug hash, record offset) slots at the end
+    of fp; returns its offset and number of slots."""
+    nslots = max(8, 2 * len(slots))
+    table = [ (0, 0) ] * nslots
+    for h, offset in slots:
+        # open addressing with linear probing
+        i = h % nslots
+        while table[i][1]:
+            i = (i + 1) % nslots
+        table[i] = (h, offset)
+    table_off = fp.tell()
+    for h, offset in table:
+        fp.write(SLOT.pack(h, offset))
+    return table_off, nslots
+
+
+def write_archive(fname, slugs, get_page):
+    """Write the pages for the slugs (get_page(slug) returns the page as bytes)
+    into a new archive file, replacing it when complete."""
+    slugs = sorted(set(slugs))
+    step = max(1, len(slugs) // ZDICT_SAMPLE)
+    zdict = build_zdict(get_page(slug) for slug in slugs[::step])
+    tmp = fname + '.part'
+    with open(tmp, 'wb') as fp:
+        fp.write(b'\0' * HEADER.size)
+        zdict_off = fp.tell()
+        fp.write(zdict)
+        slots = [ (slug_hash(slug), write_record(fp, slug, get_page(slug), zdict)) for slug in slugs ]
+        table_off, nslots = write_table(fp, slots)
+        fp.seek(0)
+        fp.write(HEADER.pack(MAGIC, VERSION, len(slugs), zdict_off, len(zdict), table_off, nslots))
+    os.replace(tmp, fname)
+
+
+def append_pages(fname, slugs, get_page):
+    """Append the pages for the slugs to the archive file, compressed with its
+    dictionary, replacing the archived pages of the same slugs (see above)."""
+    replaced_slugs = set(slugs)
+    slugs = sorted(replaced_slugs)
+    with ItemArchive(fname) as archive:
+        zdict_off = HEADER.unpack_from(archive.map)[3]
+        zdict = bytes(archive.zdict)
+        replaced = set(slug_hash(slug) for slug in slugs)
+        slots = [ (h, offset) for h, offset in archive._slots()
+                  if not (h in replaced and archive._record(offset)[0] in replaced_slugs) ]
+    with open(fname, 'r+b') as fp:
+        fp.seek(0, os.SEEK_END)
+        slots += [ (slug_hash(slug), write_record(fp, slug, get_page(slug), zdict)) for slug in slugs ]
+        table_off, nslots = write_table(fp, slots)
+        fp.flush()
+        os.fsync(fp.fileno())
+        fp.seek(0)
+        fp.write(HEADER.pack(MAGIC, VERSION, len(slots), zdict_off, len(zdict), table_off, nslots))
+    return len(slots)
+
+
+def update_archive(fname, slugs, get_page):
+    """Add the pages for the slugs to the archive file (replacing the archived
+    pages of the same slugs), or make a new one.  The pages are appended,
+    unless the archive is better written anew (see REWRITE_FRACTION)."""
+    slugs = set(slugs)
+    if not is_archive(fname):
+        write_archive(fname, slugs, get_page)
+        return len(slugs)
+    with ItemArchive(fname) as old:
+        archived = set(old.slugs())
+        total = len(slugs | archived)
+        if len(slugs) > REWRITE_FRACTION * total or old.unused() > REWRITE_FRACTION * len(old.map):
+            write_archive(fname, slugs | archived, lambda slug: get_page(slug) if slug in slugs else old[slug])
+            return total
+    return append_pages(fname, slugs, get_page)
@@ -0,0 +1,95 @@
+"""
+The price range of an item, from its page on the game site.
+
+The page has headers, stats, description and navigation, but only the first
+<span class="currency"> is needed.  The fast path scans the response as it
+arrives and stops reading at that span, so the rest of the page is neither
+downloaded nor parsed; if that fails, the whole page is parsed with
+BeautifulSoup, as before.
+"""
+
+import html
+import re
+
+from bs4 import BeautifulSoup
+
+import taunet
+
+CHUNK_SIZE = 8 * 1024
+# the scan resumes from the last start tag of a span in the data already scanned
+SPAN_START = b'<span'
+CURRENCY_RE = re.compile(rb'<span\b[^>]*\bclass\s*=\s*["\'](?:[^"\']*\s)?currency[\s"\'][^>]*>([^<]*)<')
+
+
+class ItemPageError(Exception):
+    pass
+
+
+def parse_range(text):
+    """Parse a price range like '123.45 - 130.00'."""
+    a,b = text.strip().split(" - ")
+    return (float(a.replace(',', '')), float(b.replace(',', '')))
+
+
+def scan_price_range(chunks):
+    """Scan the chunks (bytes) for the first currency span, stopping as soon
+    as it's found.  Returns (price_range, data), where price_range is None if
+    the fast path didn't find it, and data is what was read so far."""
+    data = b''
+    start = 0
+    for chunk in chunks:
+        data += chunk
+        match = CURRENCY_RE.search(data, start)
+        if match:
+            try:
+                # the text may contain character references, e.g. &#44;
+                text = html.unescape(match.group(1).decode('utf-8', errors='replace'))
+                return (parse_range(text), data)
+            except ValueError:
+                return (None, data)
+        # a span that isn't complete yet, however long, is searched again with the
+        # next chunk, from its start (or from a start tag split between the chunks)
+        last = data.rfind(SPAN_START, start)
+        start = last if last >= 0 else max(start, len(data) - len(SPAN_START) + 1)
+    return (None, data)
+
+
+def parse_price_range(page):
+    """The price range from the whole page, using the full parser."""
+    phtml = BeautifulSoup(page, "lxml")
+    tag = phtml.body.find('span', attrs={'class':"currency"}) if phtml.body else None
+    if tag is None:
+        return None
+    children = list(tag.children)
+    try:
+        return parse_range(children[0])
+    except (IndexError, TypeError, ValueError):
+        return None
+
+
+def price_range_from_chunks(chunks):
+    """The price range from the page's content as chunks of bytes; only
+    reads as many chunks as needed, unless the fast path fails."""
+    chunks = iter(chunks)
+    price_range, data = scan_price_range(chunks)
+    if price_range is None:
+        data += b''.join(chunks)
+        price_range = parse_price_range(data)
+    return price_range
+
+
+def get_price_range(slug):
+    """Fetch the item's price range (min,max) from its page.
+    Raises ItemPageError if the page can't be fetched or has no price, and
+    requests.RequestException if there's no response at all."""
+    response = taunet.get_item_page(slug, stream=True)
+    try:
+        if response.status_code != 200:
+            raise ItemPageError("cannot get '%s': status %d" % (slug, response.status_code))
+        # closing the response early drops the rest of the download
+        price_range = price_range_from_chunks(response.iter_content(CHUNK_SIZE))
+    finally:
+        response.close()
+    if price_range is None:
+        raise ItemPageError("no price found for '%s'" % slug)
+    return price_range
@@ -0,0 +1,161 @@
+"""
+Typed item records, one class per item category.
+
+The item pages show the stats as text, e.g. "3.30 kg" or "7%".  They are
+converted to numbers once, when a record is made, and written to the CSV
+files as plain numbers (weight in kg, toxicity in percent).
+"""
+
+from dataclasses import dataclass, fields
+from typing import ClassVar
+
+
+def parse_number(text):
+    if text is None or text == '':
+        return None
+    if isinstance(text, (int, float)):
+        return float(text)
+    text = text.strip().replace(',', '')
+    for unit in ('kg', '%'):
+        if text.endswith(unit):
+            text = text[:-len(unit)].strip()
+    return float(text)
+
+def parse_int(text):
+    number = parse_number(text)
+    return None if number is None else int(number)
+
+def parse_yesno(text):
+    if text is None or text == '':
+        return None
+    if isinstance(text, bool):
+        return text
+    return text.strip() == 'Yes'
+
+def parse_text(text):
+    return text
+
+PARSERS = { float: parse_number, int: parse_int, bool: parse_yesno, str: parse_text }
+
+
+def format_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'Yes' if value else 'No'
+    if isinstance(value, float):
+        return '%.12g' % value
+    return value
+
+
+@dataclass(slots=True)
+class Item:
+    name: str
+    tier: int
+    rarity: str
+    type: str
+    weight: float   # kg
+    slug: str
+    desc: str
+
+    # the CSV columns, in order; the attributes have '_' for '-'
+    COLUMNS: ClassVar[list] = ['name', 'tier', 'rarity', 'type', 'weight', 'slug', 'desc']
+
+    @classmethod
+    def from_dict(cls, item):
+        """Make a record from a dict with the CSV columns as keys,
+        e.g. as returned by slurp_item() or read from the CSV file."""
+        types = { f.name: f.type for f in fields(cls) }
+        values = {}
+        for column in cls.COLUMNS:
+            attr = column.replace('-', '_')
+            values[attr] = PARSERS[types[attr]](item.get(column))
+        return cls(**values)
+
+    def to_row(self):
+        """The record as dict with the CSV columns as keys."""
+        return { column: format_value(getattr(self, column.replace('-', '_'))) for column in self.COLUMNS }
+
+
+@dataclass(slots=True)
+class Weapon(Item):
+    range: str
+    hand_to_hand: bool
+    weapon_type: str
+    piercing_damage: float
+    impact_damage: float
+    energy_damage: float
+    accuracy: float
+
+    COLUMNS: ClassVar[list] = ['name', 'tier', 'rarity', 'type',
+        'range', 'hand-to-hand', 'weapon_type', 'piercing-damage', 'impact-damage', 'energy-damage', 'accuracy',
+        'weight', 'slug', 'desc']
+
+
+@dataclass(slots=True)
+class Armor(Item):
+    # for armor, these are actually the defense stats
+    piercing_damage: float
+    impact_damage: float
+    energy_damage: float
+
+    COLUMNS: ClassVar[list] = ['name', 'tier', 'rarity', 'type',
+        'piercing-damage', 'impact-damage', 'energy-damage',
+        'weight', 'slug', 'desc']
+
+
+@dataclass(slots=True)
+class Medical(Item):
+    strength_boost: float
+    agility_boost: float
+    stamina_boost: float
+    intelligence_boost: float
+    social_boost: float
+    base_toxicity: float   # percent
+
+    COLUMNS: ClassVar[list] = ['name', 'tier', 'rarity', 'type',
+        'strength-boost', 'agility-boost', 'stamina-boost', 'intelligence-boost', 'social-boost', 'base-toxicity',
+        'weight', 'slug', 'desc']
+
+
+@dataclass(slots=True)
+class Food(Item):
+    target_genotype: str
+    affected_stat: str
+    effect_size: str
+    duration_segments: int
+
+    COLUMNS: ClassVar[list] = ['name', 'tier', 'rarity', 'type',
+        'target-genotype', 'affected-stat', 'effect-size', 'duration-segments',
+        'weight', 'slug', 'desc']
+
+
+RECORD_CLASSES = { 'Weapon': Weapon, 'Armor': Armor, 'Medical': Medical, 'Food': Food }
+
+
+def record_class(typ):
+    return RECORD_CLASSES.get(typ, Item)
+
+
+def make_record(item):
+    """Make a record of the right class for the item's category."""
+    return record_class(item['type']).from_dict(item)
+
+
+def write_npz(records, fname):
+    """Write the records as typed columns to a numpy .npz file.
+    Missing numbers become NaN (or -1 for integers)."""
+    import numpy as np   # optional, only needed for the columnar output
+    cls = type(records[0])
+    columns = {}
+    for f in fields(cls):
+        values = [ getattr(r, f.name) for r in records ]
+        if f.type is float:
+            columns[f.name] = np.array([ np.nan if v is None else v for v in values ], dtype=np.float64)
+        elif f.type is int:
+            columns[f.name] = np.array([ -1 if v is None else v for v in values ], dtype=np.int32)
+        elif f.type is bool:
+            columns[f.name] = np.array([ bool(v) for v in values ], dtype=np.bool_)
+        else:
+            columns[f.name] = np.array([ '' if v is None else v for v in values ], dtype=np.str_)
+    np.savez_compressed(fname, **columns)
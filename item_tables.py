@@ -0,0 +1,182 @@
+"""
+In-memory tables of the item catalogue (the CSV files made by items-to-csv.py),
+indexed by slug, tier, rarity and type, and joined with the vendor prices from
+tau-vendors.csv.
+
+Loading the tables is cached in a pickle file, which is rebuilt whenever one
+of the CSV files changes, so repeated queries start without parsing anything.
+"""
+
+import csv
+import heapq
+import os
+import pickle
+from dataclasses import fields
+from glob import glob
+
+from item_records import RECORD_CLASSES, make_record, record_class
+
+INDEXED = ('slug', 'tier', 'rarity', 'type')
+CACHE_VERSION = 1
+
+
+class Table:
+    def __init__(self, records):
+        self.records = records
+        self.indexes = { attr: {} for attr in INDEXED }
+        for i, record in enumerate(records):
+            for attr in INDEXED:
+                index = self.indexes[attr]
+                value = getattr(record, attr)
+                if not value in index:
+                    index[value] = []
+                index[value].append(i)
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, slug):
+        positions = self.indexes['slug'].get(slug)
+        return self.records[positions[0]] if positions else None
+
+    def select(self, **criteria):
+        """The records with the given attribute values.  Indexed attributes are
+        looked up in their index, only the rest is checked record by record."""
+        positions = None
+        rest = {}
+        for attr, value in criteria.items():
+            if attr in self.indexes:
+                found = set(self.indexes[attr].get(value, ()))
+                positions = found if positions is None else positions & found
+            else:
+                rest[attr] = value
+        if positions is None:
+            records = self.records
+        else:
+            records = [ self.records[i] for i in sorted(positions) ]
+        if rest:
+            records = [ r for r in records if all(getattr(r, a, None) == v for a,v in rest.items()) ]
+        return records
+
+
+class VendorPrices:
+    """The vendor offers for each slug, from tau-vendors.csv."""
+    def __init__(self, entries):
+        self.offers_by_slug = {}
+        for entry in entries:
+            entry['ItemPrice'] = float(entry['ItemPrice'])
+            slug = entry['slug']
+            if not slug in self.offers_by_slug:
+                self.offers_by_slug[slug] = []
+            self.offers_by_slug[slug].append(entry)
+        # cheapest first
+        for offers in self.offers_by_slug.values():
+            offers.sort(key = lambda e: e['ItemPrice'])
+
+    def offers(self, slug, currency='credits'):
+        return [ e for e in self.offers_by_slug.get(slug, ()) if e['Currency'] == currency ]
+
+    def cheapest(self, slug, currency='credits'):
+        offers = self.offers(slug, currency)
+        return offers[0] if offers else None
+
+
+class ItemTables:
+    def __init__(self, records, vendor_entries):
+        # one table per category, and one for all items
+        self.all = Table(records)
+        self.by_type = { typ: Table(self.all.select(type=typ)) for typ in self.all.indexes['type'] }
+        self.vendors = VendorPrices(vendor_entries)
+
+    def table(self, typ=None):
+        if typ is None:
+            return self.all
+        return self.by_type.get(typ, Table([]))
+
+
+def read_csv(fname):
+    with open(fname) as fp:
+        return list(csv.DictReader(fp))
+
+
+def load(itemdir='items', vendorfile='tau-vendors.csv', cachefile='item-tables.cache'):
+    """Load the item tables, from the cache file if it is up to date."""
+    itemfiles = sorted(glob(os.path.join(itemdir, '*.csv')))
+    sources = itemfiles + ([vendorfile] if os.path.exists(vendorfile) else [])
+    stamp = [ CACHE_VERSION ] + [ (f, os.stat(f).st_mtime_ns, os.stat(f).st_size) for f in sources ]
+    if cachefile and os.path.exists(cachefile):
+        try:
+            with open(cachefile, 'rb') as fp:
+                cached_stamp, tables = pickle.load(fp)
+            if cached_stamp == stamp:
+                return tables
+        except Exception:
+            pass # unreadable cache, just rebuild it
+    records = [ make_record(row) for f in itemfiles for row in read_csv(f) ]
+    vendor_entries = read_csv(vendorfile) if os.path.exists(vendorfile) else []
+    tables = ItemTables(records, vendor_entries)
+    if cachefile:
+        with open(cachefile, 'wb') as fp:
+            pickle.dump((stamp, tables), fp, pickle.HIGHEST_PROTOCOL)
+    return tables
+
+
+def damage(record):
+    """Total damage of a weapon (or total defense of an armor)."""
+    values = [ getattr(record, attr, None) for attr in ('piercing_damage', 'impact_damage', 'energy_damage') ]
+    if all(v is None for v in values):
+        return None
+    return sum(v or 0.0 for v in values)
+
+
+# the fields computed by value(), besides the CSV columns
+DERIVED_FIELDS = { 'damage': float, 'damage_per_kg': float, 'price': float, 'vendor': str,
+                   'station': str, 'price_per_damage': float }
+
+
+def field_types(typ=None):
+    """The type of each field of the item category (or of any category)."""
+    types = {}
+    for cls in [ record_class(typ) ] if typ else RECORD_CLASSES.values():
+        attr_types = { f.name: f.type for f in fields(cls) }
+        for column in cls.COLUMNS:
+            types[column] = attr_types[column.replace('-', '_')]
+    types.update(DERIVED_FIELDS)
+    return types
+
+
+def value(tables, record, field):
+    """The value of a record's field, including the derived fields
+    damage, damage_per_kg, price, vendor, station, price_per_damage."""
+    if field == 'damage':
+        return damage(record)
+    if field == 'damage_per_kg':
+        dmg = damage(record)
+        return dmg / record.weight if dmg is not None and record.weight else None
+    if field in ('price', 'vendor', 'station', 'price_per_damage'):
+        offer = tables.vendors.cheapest(record.slug)
+        if offer is None:
+            return None
+        if field == 'price':
+            return offer['ItemPrice']
+        if field == 'vendor':
+            return offer['Vendor']
+        if field == 'station':
+            return offer['Station']
+        dmg = damage(record)
+        return offer['ItemPrice'] / dmg if dmg else None
+    return getattr(record, field.replace('-', '_'), None)
+
+
+def top(tables, records, field, k=None, reverse=True):
+    """The records sorted by the field (largest first, unless reverse is False),
+    leaving out records without a value.  With k, only the top k are computed."""
+    keyed = [ (value(tables, r, field), i) for i, r in enumerate(records) ]
+    keyed = [ kv for kv in keyed if kv[0] is not None ]
+    if k is None:
+        keyed.sort(reverse=reverse)
+    elif reverse:
+        keyed = heapq.nlargest(k, keyed)
+    else:
+        keyed = heapq.nsmallest(k, keyed)
+    return [ records[i] for v, i in keyed ]
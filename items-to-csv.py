@@ -5,6 +5,8 @@ import csv
 import re
 from bs4 import BeautifulSoup
 from glob import glob
+from item_archive import ItemArchive
+from item_records import make_record, record_class, write_npz
 
 def extract_stat(stats, cls):
     tag  = stats.find('li', attrs={'class':cls})
@@ -31,17 +33,14 @@ def extract_food_stats(item):
         item['affected-stat'] = stat
         item['duration-segments'] = duration
 
-def slurp_item(itemfile):
-    f = open(itemfile)
-    itemhtml = f.read()
-    f.close()
+def parse_item(slug, itemhtml):
     phtml = BeautifulSoup(itemhtml, 'lxml')
     body = phtml.body
     item_header = body.find('div', attrs = {'class': 'item-detailed-header'})
     item_stats  = body.find('div', attrs = {'class': 'item-detailed-stats'})
     item_desc   = body.find('p', attrs = {'class': 'item-detailed-description'})
     item = {
-        'slug'  : itemfile[:-5],
+        'slug'  : slug,
         'name'  : item_header.find('h1').text,
         'desc'  : item_desc.text,
         'rarity': extract_stat(item_stats, 'rarity common')
@@ -55,28 +54,31 @@ def slurp_item(itemfile):
         extract_food_stats(item)
     return item
 
+def slurp_item(itemfile):
+    f = open(itemfile)
+    itemhtml = f.read()
+    f.close()
+    return parse_item(itemfile[:-5], itemhtml)
+
 
 if __name__ == '__main__':
-    items = [slurp_item(f) for f in glob('*.html')]
-    types = set([item['type'] for item in items])
-    fields1 = ['name', 'tier', 'rarity', 'type']
-    fields3 = ['weight', 'slug', 'desc']
+    # --npz: also write typed columns (requires numpy)
+    # optional argument: an item archive (made by item-archive.py) to read instead of *.html
+    npz = '--npz' in sys.argv[1:]
+    archives = [ a for a in sys.argv[1:] if a != '--npz' ]
+    if archives:
+        with ItemArchive(archives[0]) as archive:
+            items = [make_record(parse_item(slug, html.decode())) for slug, html in archive.pages()]
+    else:
+        items = [make_record(slurp_item(f)) for f in sorted(glob('*.html'))]
+    types = set([item.type for item in items])
     for typ in types:
-        if typ=='Weapon':
-            fields2 = ['range', 'hand-to-hand', 'weapon_type', 'piercing-damage', 'impact-damage', 'energy-damage', 'accuracy']
-        elif typ=='Armor':
-            fields2 = ['piercing-damage', 'impact-damage', 'energy-damage']
-        elif typ=='Medical':
-            fields2 = [ 'strength-boost', 'agility-boost', 'stamina-boost', 'intelligence-boost', 'social-boost', 'base-toxicity' ]
-        elif typ=='Food':
-            fields2 = [ 'target-genotype', 'affected-stat', 'effect-size', 'duration-segments' ]
-        else:
-            fields2 = []
-        fieldnames = fields1 + fields2 + fields3
+        records = [ item for item in items if item.type==typ ]
         csvfilename = typ + '.csv'
         with open(csvfilename, 'w') as cf:
-            cw = csv.DictWriter(cf, fieldnames, extrasaction='ignore')
+            cw = csv.DictWriter(cf, record_class(typ).COLUMNS)
             cw.writeheader()
-            for item in filter(lambda i: i['type']==typ, items):
-                cw.writerow(item)
-
+            for record in records:
+                cw.writerow(record.to_row())
+        if npz:
+            write_npz(records, typ + '.npz')
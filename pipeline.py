@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from fnmatch import fnmatch
+from glob import glob
+
+SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = 'pipeline-state.json'
+LOG_DIR = 'pipeline-logs'
+CHUNK_SIZE = 1024 * 1024
+
+
+class Stage:
+    """One step of the pipeline: a script with its arguments, run in cwd.
+    inputs and outputs are paths or glob patterns (relative to the data
+    directory); the stage runs if a required input is there, and its inputs,
+    its outputs or the script have changed since the last run.  Optional
+    inputs are used if they are there.  stdin lists files passed to the
+    script's stdin, stdout the file its output is written to."""
+    def __init__(self, name, script, args=(), inputs=(), optional=(), outputs=(), cwd='.',
+                 stdin=(), stdout=None, always=False):
+        self.name = name
+        self.script = script
+        self.args = args
+        self.inputs = list(inputs)
+        self.optional = list(optional) + list(stdin)
+        self.outputs = list(outputs) + ([stdout] if stdout else [])
+        self.cwd = cwd
+        self.stdin = list(stdin)
+        self.stdout = stdout
+        # run every time, e.g. for the current fuel prices, which change without any input changing
+        self.always = always
+    def command(self):
+        args = self.args() if callable(self.args) else list(self.args)
+        return [ sys.executable, os.path.join(SCRIPTS, self.script) ] + args
+
+
+def system_dirs():
+    """The system directories with saved vendor pages (<system>/<station>/fuel-price)."""
+    return sorted(set(os.path.dirname(os.path.dirname(f)) for f in glob('*/*/fuel-price')))
+
+
+STAGES = [
+    # vendor chain
+    Stage('vendors', 'vendors-to-csv.py', args=system_dirs,
+          inputs=['*/*/fuel-price'], optional=['*/*/*.html'], outputs=['tau-vendors.csv']),
+    Stage('strategy', 'get-fuel-price-strategy.py',
+          inputs=['tau-vendors.csv'], outputs=['fuel-price-strategy.csv']),
+    Stage('fuel-prices', 'run-fuel-price-strategy.py',
+          inputs=['fuel-price-strategy.csv'], stdout='fuel-prices.txt', always=True),
+    # items chain
+    Stage('vendor-slugs', 'vendor-items.py', inputs=['tau-vendors.csv'], stdout='vendor-slugs.txt'),
+    Stage('tauhead-slugs', 'tauhead-items.py', inputs=['tauhead-items.json'], stdout='tauhead-slugs.txt'),
+    Stage('changelog-slugs', 'changelog-items.py', args=['changelogs'],
+          inputs=['changelogs'], stdout='changelog-slugs.txt'),
+    Stage('items', 'get-items.py', stdin=['vendor-slugs.txt', 'tauhead-slugs.txt', 'changelog-slugs.txt'],
+          outputs=['items/*.html']),
+    Stage('items-csv', 'items-to-csv.py', cwd='items', inputs=['items/*.html'], outputs=['items/*.csv']),
+]
+
+
+def file_hash(path, cache):
+    """The content hash of a file, reused from the cache while size and
+    modification time stay the same."""
+    st = os.stat(path)
+    cached = cache.get(path)
+    if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+        return cached[2]
+    h = hashlib.sha1()
+    with open(path, 'rb') as fp:
+        while True:
+            chunk = fp.read(CHUNK_SIZE)
+            if not chunk: break
+            h.update(chunk)
+    cache[path] = [ st.st_size, st.st_mtime_ns, h.hexdigest() ]
+    return h.hexdigest()
+
+
+def expand(pattern):
+    """The files matching the pattern; directories are searched recursively."""
+    files = []
+    for path in sorted(glob(pattern)):
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                files.extend(os.path.join(dirpath, fn) for fn in sorted(filenames))
+        else:
+            files.append(path)
+    return files
+
+
+def hash_patterns(patterns, cache):
+    """The content hashes of all files matching the patterns, by path."""
+    return { path: file_hash(path, cache) for pattern in patterns for path in expand(pattern) }
+
+
+def stage_key(stage, cache):
+    """The hash of everything the stage's result depends on: its command, its
+    script and the contents of its inputs."""
+    inputs = hash_patterns(stage.inputs + stage.optional, cache)
+    script = file_hash(os.path.join(SCRIPTS, stage.script), cache)
+    data = json.dumps([ stage.script, stage.command()[2:], stage.cwd, script, sorted(inputs.items()) ])
+    return hashlib.sha1(data.encode()).hexdigest()
+
+
+def missing_inputs(stage):
+    missing = [ p for p in stage.inputs if not glob(p) ]
+    if stage.stdin and not any(os.path.exists(f) for f in stage.stdin):
+        missing.append(" or ".join(stage.stdin))
+    return missing
+
+
+def upstream(stages):
+    """The stages each stage depends on: those producing one of its inputs."""
+    def produces(output, pattern):
+        return output == pattern or fnmatch(output, pattern) or fnmatch(pattern, output)
+    deps = {}
+    for stage in stages:
+        deps[stage.name] = [ other.name for other in stages if other is not stage and
+                             any(produces(o, i) for o in other.outputs for i in stage.inputs + stage.optional) ]
+    return deps
+
+
+def select(stages, targets):
+    """The target stages and everything they depend on, in declaration order."""
+    if not targets:
+        return list(stages)
+    deps = upstream(stages)
+    names = set()
+    def add(name):
+        if name in names: return
+        names.add(name)
+        for dep in deps[name]:
+            add(dep)
+    known = set(s.name for s in stages)
+    for target in targets:
+        if not target in known:
+            raise SystemExit("unknown stage: %s (stages: %s)" % (target, ", ".join(s.name for s in stages)))
+        add(target)
+    return [ s for s in stages if s.name in names ]
+
+
+def load_state(fname):
+    try:
+        with open(fname) as fp:
+            return json.load(fp)
+    except (FileNotFoundError, ValueError):
+        return { 'stages': {}, 'hashes': {} }
+
+
+def save_state(state, fname):
+    with open(fname + '.part', 'w') as fp:
+        json.dump(state, fp, indent=1, sort_keys=True)
+    os.replace(fname + '.part', fname)
+
+
+def is_up_to_date(stage, key, state, cache):
+    """Whether the stage ran with the same key, and its outputs are unchanged since."""
+    recorded = state['stages'].get(stage.name)
+    if stage.always or not recorded or recorded['key'] != key:
+        return False
+    outputs = hash_patterns(stage.outputs, cache)
+    return outputs == recorded['outputs'] and all(glob(p) for p in stage.outputs)
+
+
+def run_stage(stage, logdir):
+    """Run the stage's script.  Returns True on success."""
+    os.makedirs(logdir, exist_ok=True)
+    stdin = b''
+    for fname in stage.stdin:
+        if os.path.exists(fname):
+            with open(fname, 'rb') as fp:
+                stdin += fp.read()
+    with open(os.path.join(logdir, stage.name + '.log'), 'wb') as log:
+        result = subprocess.run(stage.command(), cwd=stage.cwd, input=stdin,
+                                stdout=subprocess.PIPE if stage.stdout else log, stderr=log)
+    if result.returncode != 0:
+        return False
+    if stage.stdout:
+        # only replace the output when complete
+        with open(stage.stdout + '.part', 'wb') as fp:
+            fp.write(result.stdout)
+        os.replace(stage.stdout + '.part', stage.stdout)
+    return True
+
+
+def run_pipeline(stages, nworkers=4, force=(), dry_run=False, statefile=STATE_FILE, logdir=LOG_DIR, log=print):
+    """Bring the stages up to date, running independent stages in parallel.
+    Returns the status and run time of each stage, by name."""
+    state = load_state(statefile)
+    cache = state['hashes']
+    deps = upstream(stages)
+    names = set(s.name for s in stages)
+    deps = { name: [ d for d in ds if d in names ] for name, ds in deps.items() }
+    results = {}
+    pending = list(stages)
+    running = {}
+
+    def check(stage):
+        """Decide what to do with a stage whose upstream stages are done."""
+        if any(results[d]['status'] in ('failed', 'blocked') for d in deps[stage.name]):
+            return 'blocked', None
+        missing = missing_inputs(stage)
+        if missing:
+            return 'no input', "missing " + ", ".join(missing)
+        key = stage_key(stage, cache)
+        if not stage.name in force and is_up_to_date(stage, key, state, cache):
+            return 'up to date', None
+        return 'run', key
+
+    def finish(stage, status, seconds, detail=None):
+        results[stage.name] = { 'status': status, 'seconds': seconds }
+        log("%-16s %s%s" % (stage.name, status, " (%s)" % detail if detail else ""))
+
+    with ThreadPoolExecutor(max_workers=nworkers) as executor:
+        while pending or running:
+            for stage in [ s for s in pending if all(d in results for d in deps[s.name]) ]:
+                pending.remove(stage)
+                action, key = check(stage)
+                if action != 'run':
+                    finish(stage, action, 0.0, key)
+                elif dry_run:
+                    finish(stage, 'would run', 0.0)
+                else:
+                    log("%-16s started" % stage.name)
+                    running[executor.submit(run_stage, stage, logdir)] = (stage, key, time.time())
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, key, started = running.pop(future)
+                seconds = time.time() - started
+                if future.result():
+                    state['stages'][stage.name] = { 'key': key, 'outputs': hash_patterns(stage.outputs, cache),
+                                                    'time': time.time(), 'seconds': seconds }
+                    save_state(state, statefile)
+                    finish(stage, 'ran', seconds)
+                else:
+                    state['stages'].pop(stage.name, None)
+                    save_state(state, statefile)
+                    finish(stage, 'failed', seconds, "see %s" % os.path.join(logdir, stage.name + '.log'))
+    if not dry_run:
+        save_state(state, statefile)
+    return results
+
+
+def print_timing(stages, results, wall_time):
+    print()
+    print("%-16s %-12s %8s" % ("stage", "status", "seconds"))
+    for stage in stages:
+        r = results[stage.name]
+        print("%-16s %-12s %8.2f" % (stage.name, r['status'], r['seconds']))
+    total = sum(r['seconds'] for r in results.values())
+    print("wall time %.2fs, total stage time %.2fs" % (wall_time, total))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the stages whose inputs changed since the last run.")
+    parser.add_argument('targets', nargs='*', metavar='STAGE',
+                        help="stages to bring up to date, with the stages they depend on (default: all)")
+    parser.add_argument('-j', type=int, default=4, dest='nworkers', help="stages run in parallel (default: 4)")
+    parser.add_argument('-f', '--force', action='append', default=[], metavar='STAGE',
+                        help="run the stage even if it is up to date")
+    parser.add_argument('-n', '--dry-run', action='store_true',
+                        help="only show which stages are out of date (the stages after them may be too)")
+    parser.add_argument('-l', '--list', action='store_true', help="list the stages")
+    args = parser.parse_args()
+
+    stages = select(STAGES, args.targets)
+    if args.list:
+        deps = upstream(STAGES)
+        for stage in stages:
+            print("%-16s %-32s after: %s" % (stage.name, stage.script, ", ".join(deps[stage.name]) or "-"))
+        sys.exit(0)
+    t0 = time.time()
+    results = run_pipeline(stages, args.nworkers, set(args.force), args.dry_run)
+    if not args.dry_run:
+        print_timing(stages, results, time.time() - t0)
+    if any(r['status'] in ('failed', 'blocked') for r in results.values()):
+        sys.exit(1)
@@ -1,99 +1,292 @@
 #!/usr/bin/env python3
 
 import csv
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from intervals import Interval, fpc_interval
 import requests
 import sys
+import item_pages
+import threading
+import time
 
 verbose = False
+crosscheck = False
+nworkers = 8
 
 
 def read_strategy(fname):
+    """Read the strategy file. Returns a list of (station, candidates),
+    where candidates are the strategy lines for the station in order of preference."""
     with open(fname) as fp:
         cr = csv.DictReader(fp)
-        strats = list(cr)
-    return strats
+        strats = {}
+        for strat in cr:
+            station = strat['Station']
+            if not station in strats:
+                strats[station] = []
+            strats[station].append(strat)
+    # older strategy files have only one line per station, without rank
+    for candidates in strats.values():
+        candidates.sort(key = lambda c: int(c.get('Rank') or 0))
+    return list(strats.items())
+
+
+def get_parents(candidates):
+    """The stations whose fuel price is needed by the candidates."""
+    return set(c['OtherStation'] for c in candidates if c['OtherStation'])
+
+
+def sort_by_level(strategies):
+    """Build the dependency DAG of the stations, and sort the strategies by level.
+    Level 0 stations don't depend on any other station, level k stations depend
+    on stations at level k-1 (or lower)."""
+    parents = { station: get_parents(candidates) for station,candidates in strategies }
+    levels = {}
+    def level(station, path=()):
+        if station in levels:
+            return levels[station]
+        if station in path:
+            raise Exception("cyclic strategy: %s" % " -> ".join(path + (station,)))
+        # parents without a strategy of their own are never resolved; their
+        # candidates will just be skipped
+        lvl = max((level(p, path + (station,)) + 1 for p in parents[station] if p in parents), default=0)
+        levels[station] = lvl
+        return lvl
+    for station in parents:
+        level(station)
+    return sorted(strategies, key = lambda s: levels[s[0]])
+
+
+# output and timing of the station being resolved in the current thread
+current = threading.local()
+
+
+def say(msg):
+    """Collect output for the current station, so that it doesn't get
+    mixed up with output for stations resolved concurrently."""
+    current.lines.append(msg)
+
+
+# the pending or finished resolution of each station
+station_futures = {}
+
+
+def wait_for(station):
+    """Wait until the station has been resolved (successfully or not)."""
+    if station in station_futures:
+        station_futures[station].result()
+
+
+# item price ranges fetched during this run, by slug
+price_ranges = {}
 
 
 def get_minmax(slug):
-    req = requests.get("https://taustation.space/item/" + slug)
-    if req.status_code != 200:
-        print("FATAL: failed to get data for '%s'" % slug)
-        sys.exit(1)
-    html = req.text
-    phtml = BeautifulSoup(html, "lxml")
-    body = phtml.body
-    tag = body.find('span', attrs={'class':"currency"})
-    children = list(tag.children)
-    price_range = children[0]
-    a,b = price_range.split(" - ")
-    mn = float(a)
-    mx = float(b)
-    return (mn,mx)
-
-
-def is_close(a,b):
-    tolerance = 0.001
-    return abs(a/b - 1.0) < tolerance
-
-
-def run_strategy(strat, fuel_prices):
-    station = strat['Station']
+    """Get the item's price range from the item page.
+    Returns None if it can't be determined."""
+    if slug in price_ranges:
+        return price_ranges[slug]
+    started = time.time()
+    try:
+        price_range = item_pages.get_price_range(slug)
+    except (requests.RequestException, item_pages.ItemPageError) as e:
+        say("WARNING: failed to get data for '%s': %s" % (slug, e))
+        price_range = None
+    finally:
+        current.fetch_time += time.time() - started
+    price_ranges[slug] = price_range
+    return price_range
+
+
+# relative uncertainty of the FPC for strategy files without observed prices
+LEGACY_FPC_TOLERANCE = 0.001
+
+
+def get_fpc(strat, fpc_key, itemprice_key, fuelprice_key):
+    """The FPC of a candidate as interval, bounded by the observed prices
+    (and the error of an estimated fuel price)."""
+    if strat.get(itemprice_key):
+        return fpc_interval(strat[itemprice_key], strat[fuelprice_key], strat.get(fuelprice_key + 'Error'))
+    fpc = float(strat[fpc_key])
+    return Interval(fpc * (1.0 - LEGACY_FPC_TOLERANCE), fpc * (1.0 + LEGACY_FPC_TOLERANCE))
+
+
+def try_candidate(station, strat, fuel_prices):
+    """Try to estimate the station's fuel price using one candidate item.
+    Returns the fuel price, or None if this candidate doesn't resolve it."""
     slug = strat['slug']
-    fpc = float(strat['FuelPriceCoefficient'])
+    fpc = get_fpc(strat, 'FuelPriceCoefficient', 'ItemPrice', 'FuelPrice')
     other_station = strat['OtherStation']
-    other_fpc = float(strat['OtherFPC'])
-    itemprice_min, itemprice_max = get_minmax(slug)
+    if other_station:
+        wait_for(other_station)
+    if other_station and not other_station in fuel_prices:
+        # don't waste a lookup
+        say("WARNING: can't use '%s' for %s, fuel price on %s not known" % (slug, station, other_station))
+        return None
+    minmax = get_minmax(slug)
+    if minmax is None:
+        return None
+    itemprice_min, itemprice_max = minmax
     if not other_station:
         # if no comparison station, price should be unique
         if itemprice_min != itemprice_max:
-            print("FATAL: item price for '%s' is not unique but %f--%f" % (slug, itemprice_min, itemprice_max))
-            sys.exit(1)
+            say("WARNING: item price for '%s' is not unique but %f--%f" % (slug, itemprice_min, itemprice_max))
+            return None
         itemprice = itemprice_min
         if verbose:
-            print("%s: using '%s', price=%.2f, fpc=%.5f => fuelprice=%.2f"
-                % (station, slug, itemprice, fpc, itemprice / fpc))
+            say("%s: using '%s', price=%.2f, fpc=%.5f => fuelprice=%s"
+                % (station, slug, itemprice, fpc.midpoint(), Interval.rounded(itemprice) / fpc))
     else:
         # estimate the item price on the comparison station
         if verbose:
-            print("%s: using '%s', price=%.2f-%.2f, fpc=%.5f"
-                % (station, slug, itemprice_min, itemprice_max, fpc))
+            say("%s: using '%s', price=%.2f-%.2f, fpc=%.5f"
+                % (station, slug, itemprice_min, itemprice_max, fpc.midpoint()))
             blank = " " * len(station)
+        other_fpc = get_fpc(strat, 'OtherFPC', 'OtherItemPrice', 'OtherFuelPrice')
         itemprice_other = fuel_prices[other_station] * other_fpc
         if verbose:
-            print("%s  comparing with %s with fpc=%.5f, estimated price %.2f"
-                % (blank, other_station, other_fpc, itemprice_other))
-        if is_close(itemprice_other, itemprice_min):
+            say("%s  comparing with %s with fpc=%.5f, estimated price %s"
+                % (blank, other_station, other_fpc.midpoint(), itemprice_other))
+        matches_min = itemprice_other.overlaps(Interval.rounded(itemprice_min))
+        matches_max = itemprice_other.overlaps(Interval.rounded(itemprice_max))
+        if itemprice_min == itemprice_max:
+            # a single price, whichever end the other station's price is
+            itemprice = itemprice_min
+            if verbose:
+                say("%s  only one price => price=%.2f => fuelprice=%s"
+                    % (blank, itemprice, Interval.rounded(itemprice) / fpc))
+        elif matches_min and not matches_max:
             itemprice = itemprice_max
             if verbose:
-                print("%s  other station's price matches minimum => price=%.2f => fuelprice=%.2f"
-                    % (blank, itemprice, itemprice / fpc))
-        elif is_close(itemprice_other, itemprice_max):
+                say("%s  other station's price matches minimum => price=%.2f => fuelprice=%s"
+                    % (blank, itemprice, Interval.rounded(itemprice) / fpc))
+        elif matches_max and not matches_min:
             itemprice = itemprice_min
             if verbose:
-                print("%s  other station's price matches maximum => price=%.2f => fuelprice=%.2f"
-                    % (blank, itemprice, itemprice / fpc))
+                say("%s  other station's price matches maximum => price=%.2f => fuelprice=%s"
+                    % (blank, itemprice, Interval.rounded(itemprice) / fpc))
         else:
-            print("FATAL: other station's item price for slug '%s' is %f, can't reconcile with %f--%f"
+            say("WARNING: other station's item price for slug '%s' is %s, can't reconcile with %f--%f"
                 % (slug, itemprice_other, itemprice_min, itemprice_max))
-            sys.exit(1)
+            return None
     # item price resolved, now calcuate fuel price
-    fp = itemprice / fpc
-    # store result
-    fuel_prices[station] = fp
+    return Interval.rounded(itemprice) / fpc
+
+
+def run_strategy(station, candidates, fuel_prices):
+    """Try the candidates in order until one resolves the station's fuel price.
+    If another candidate can be checked cheaply (its price is already known,
+    or -x was given), use it to cross-check the result."""
+    for i,strat in enumerate(candidates):
+        fp = try_candidate(station, strat, fuel_prices)
+        if fp is None: continue
+        # cross-check with the next usable candidate
+        for other_strat in candidates[i+1:]:
+            if not (crosscheck or other_strat['slug'] in price_ranges): continue
+            other_station = other_strat['OtherStation']
+            if other_station and not other_station in fuel_prices: continue
+            other_fp = try_candidate(station, other_strat, fuel_prices)
+            if other_fp is None: continue
+            if fp.overlaps(other_fp):
+                # both bounds hold, so the fuel price is in both
+                fp = fp.intersect(other_fp)
+                if verbose:
+                    say("%s: cross-check with '%s' agrees => fuelprice=%s" % (station, other_strat['slug'], fp))
+            else:
+                say("WARNING: cross-check for %s with '%s' gives fuelprice=%s instead of %s"
+                    % (station, other_strat['slug'], other_fp, fp))
+            break
+        # store result
+        fuel_prices[station] = fp
+        current.parent = strat['OtherStation']
+        return True
+    say("WARNING: no candidate item resolves the fuel price for %s" % station)
+    return False
+
+
+def resolve_station(station, candidates, fuel_prices, t0):
+    """Resolve one station; runs concurrently with the other stations.
+    Returns the output lines, the resolving parent and timings."""
+    current.lines = []
+    current.fetch_time = 0.0
+    current.parent = None
+    started = time.time() - t0
+    try:
+        # start fetching right away if the first candidate doesn't need a parent,
+        # otherwise the lookup may be wasted if the parent can't be resolved
+        if not candidates[0]['OtherStation']:
+            get_minmax(candidates[0]['slug'])
+        run_strategy(station, candidates, fuel_prices)
+    except Exception as e:
+        # e.g. a malformed strategy line; the other stations go on
+        say("WARNING: failed to resolve %s: %s" % (station, e))
+    return {
+        'lines': current.lines,
+        'parent': current.parent,
+        'started': started,
+        'finished': time.time() - t0,
+        'fetch_time': current.fetch_time
+    }
+
+
+def print_timing(stations, timings, wall_time):
+    """Print the critical path, i.e. the chain of resolving parents leading
+    to the station resolved last."""
+    fetch_time = sum(t['fetch_time'] for t in timings.values())
+    print("wall time %.2fs, total fetch time %.2fs, %d workers" % (wall_time, fetch_time, nworkers))
+    if not stations: return
+    path = []
+    station = max(stations, key = lambda s: timings[s]['finished'])
+    while station:
+        path.append(station)
+        station = timings[station]['parent']
+    path.reverse()
+    steps = []
+    prev_finished = 0.0
+    for station in path:
+        finished = timings[station]['finished']
+        steps.append("%s (%.2fs)" % (station, finished - prev_finished))
+        prev_finished = finished
+    print("critical path %.2fs: %s" % (prev_finished, " -> ".join(steps)))
 
 
 if __name__ == '__main__':
-    # verbose flag?
-    if len(sys.argv)>1 and sys.argv[1]=='-v':
-        verbose = True
-    strategies = read_strategy("fuel-price-strategy.csv")
+    # flags: -v for verbose output, -x to always cross-check, -j N for number of workers
+    flags = sys.argv[1:]
+    verbose = '-v' in flags
+    crosscheck = '-x' in flags
+    if '-j' in flags:
+        try:
+            nworkers = int(flags[flags.index('-j') + 1])
+            if nworkers < 1: raise ValueError
+        except (IndexError, ValueError):
+            print("usage: %s [-v] [-x] [-j N]" % sys.argv[0], file=sys.stderr)
+            sys.exit(2)
+    strategies = sort_by_level(read_strategy("fuel-price-strategy.csv"))
     fuel_prices = {}
-    for strat in strategies:
-        run_strategy(strat, fuel_prices)
+    # submit in order of level, so that a station's parents are always
+    # picked up by a worker before the station itself
+    t0 = time.time()
+    with ThreadPoolExecutor(max_workers=nworkers) as executor:
+        for station,candidates in strategies:
+            station_futures[station] = executor.submit(resolve_station, station, candidates, fuel_prices, t0)
+        timings = {}
+        for station,candidates in strategies:
+            timings[station] = station_futures[station].result()
+            for line in timings[station]['lines']:
+                print(line)
+    wall_time = time.time() - t0
     # print result
     if verbose: print()
-    stations_ascending = sorted(fuel_prices.keys(), key = lambda k: fuel_prices[k])
+    stations_ascending = sorted(fuel_prices.keys(), key = lambda k: fuel_prices[k].midpoint())
     for station in stations_ascending:
-        print("%8.2f  %s" % (fuel_prices[station], station))
-
+        fp = fuel_prices[station]
+        if verbose:
+            print("%8.2f  %s  %s" % (fp.midpoint(), station, fp))
+        else:
+            print("%8.2f  %s" % (fp.midpoint(), station))
+    for station,candidates in strategies:
+        if not station in fuel_prices:
+            print("%8s  %s" % ("unknown", station))
+    print()
+    print_timing([s for s,c in strategies], timings, wall_time)
@@ -0,0 +1,165 @@
+"""
+Sensitivity of a fuel price strategy: which items and stations the estimate
+for each station hinges on, and fallback candidates for when they fail.
+
+A station can be resolved with an item that is only sold on that station (its
+price gives the fuel price directly), or with an item sold on exactly two
+stations, once the fuel price on the other station (the parent) is known.
+These options are the edges of the dependency graph; a failed item lookup
+removes an edge, and a station that can't be resolved removes all edges to
+its dependents.
+"""
+
+import csv
+
+# additional candidates per station, after the strategy's own
+MAX_FALLBACKS = 4
+
+
+def station_options(slug_entries, unique_slugs, dual_slugs):
+    """The usable items for each station, as (entry, parent_entry) pairs,
+    where parent_entry is None for an item that is only sold on the station.
+    slug_entries are the entries by slug, with the ambiguous ones removed."""
+    options = {}
+    for slug in unique_slugs:
+        for entry in slug_entries[slug]:
+            options.setdefault(entry['Station'], []).append((entry, None))
+    for slug in dual_slugs:
+        se = slug_entries[slug]
+        if len(se) != 2 or se[0]['Station'] == se[1]['Station']: continue
+        options.setdefault(se[0]['Station'], []).append((se[0], se[1]))
+        options.setdefault(se[1]['Station'], []).append((se[1], se[0]))
+    return options
+
+
+def resolve(options, failed_slugs=(), failed_stations=()):
+    """The depth of each station that can still be resolved if the given items
+    and stations fail: 0 if an item only sold there resolves it, otherwise one
+    more than its shallowest resolvable parent."""
+    depths = {}
+    depth = 0
+    while True:
+        resolved = []
+        for station, opts in options.items():
+            if station in depths or station in failed_stations: continue
+            for entry, parent_entry in opts:
+                if entry['slug'] in failed_slugs: continue
+                if parent_entry is None and depth == 0:
+                    break
+                if parent_entry is not None and depths.get(parent_entry['Station']) == depth - 1:
+                    break
+            else:
+                continue
+            resolved.append(station)
+        if not resolved:
+            return depths
+        for station in resolved:
+            depths[station] = depth
+        depth += 1
+
+
+class Sensitivity:
+    """The dependency depth, alternatives and single points of failure of each
+    resolvable station."""
+    def __init__(self, options):
+        self.options = options
+        self.depths = resolve(options)
+        # single points of failure: the items and stations whose failure leaves the station unresolved
+        self.critical_slugs = { station: [] for station in self.depths }
+        self.critical_stations = { station: [] for station in self.depths }
+        slugs = sorted(set(entry['slug'] for opts in options.values() for entry, parent_entry in opts))
+        for slug in slugs:
+            remaining = resolve(options, failed_slugs={slug})
+            for station in self.depths:
+                if not station in remaining:
+                    self.critical_slugs[station].append(slug)
+        # stations that are never resolved can't fail any other
+        for failed in sorted(self.depths):
+            remaining = resolve(options, failed_stations={failed})
+            for station in self.depths:
+                if station != failed and not station in remaining:
+                    self.critical_stations[station].append(failed)
+
+    def alternatives(self, station):
+        """The usable items of the station (the parent must be resolvable)."""
+        return [ (entry, parent_entry) for entry, parent_entry in self.options.get(station, ())
+                 if parent_entry is None or parent_entry['Station'] in self.depths ]
+
+    def parents(self, station):
+        return set(parent_entry['Station'] for entry, parent_entry in self.alternatives(station) if parent_entry)
+
+    def dependents(self, station):
+        """The stations left unresolved if this one fails."""
+        return sorted(s for s, critical in self.critical_stations.items() if station in critical)
+
+    def rows(self):
+        """One row per station, deepest first.  Items are separated by spaces,
+        stations (which have spaces in their names) by semicolons."""
+        rows = []
+        for station in sorted(self.depths, key = lambda s: (-self.depths[s], s)):
+            rows.append({
+                'Station': station,
+                'Depth': self.depths[station],
+                'Candidates': len(self.alternatives(station)),
+                'Parents': "; ".join(sorted(self.parents(station))),
+                'CriticalItems': " ".join(self.critical_slugs[station]),
+                'CriticalStations': "; ".join(self.critical_stations[station]),
+                'Dependents': len(self.dependents(station))
+                })
+        return rows
+
+
+FIELDNAMES = ['Station', 'Depth', 'Candidates', 'Parents', 'CriticalItems', 'CriticalStations', 'Dependents']
+
+
+def fallbacks(station, options, order, candidates):
+    """Fallback candidates for the station, for when all of the strategy's own
+    candidates fail: items whose parent comes earlier in the order of
+    resolution (so that the strategy stays acyclic), preferring parents that
+    none of the previous candidates depend on, then shallower parents, then
+    the more expensive items.  Returns (entry, parent_entry) pairs."""
+    position = { s: i for i, s in enumerate(order) }
+    used_slugs = set(c['slug'] for c in candidates)
+    covered = set(c['parent'] for c in candidates)
+    usable = [ (entry, parent_entry) for entry, parent_entry in options.get(station, ())
+               if not entry['slug'] in used_slugs
+               and (parent_entry is None or position.get(parent_entry['Station'], len(order)) < position[station]) ]
+    def parent(option):
+        return option[1]['Station'] if option[1] else None
+    usable.sort(key = lambda o: (position[parent(o)] if parent(o) else -1, -float(o[0]['FuelPriceCoefficient'])))
+    chosen = []
+    # first one for each parent not covered yet, then the rest in order
+    for option in usable:
+        if len(chosen) == MAX_FALLBACKS: break
+        if not parent(option) in covered:
+            chosen.append(option)
+            covered.add(parent(option))
+    for option in usable:
+        if len(chosen) == MAX_FALLBACKS: break
+        if not option in chosen:
+            chosen.append(option)
+    return chosen
+
+
+def print_report(title, sensitivity):
+    """Print the single points of failure."""
+    rows = [ row for row in sensitivity.rows() if row['CriticalItems'] or row['CriticalStations'] ]
+    print("Single points of failure, %s: %d of %d stations" % (title, len(rows), len(sensitivity.depths)))
+    for row in rows:
+        print("  %s (depth %d): items %s; stations %s"
+              % (row['Station'], row['Depth'], row['CriticalItems'] or "-", row['CriticalStations'] or "-"))
+
+
+def write_report(fname, strategy_options, planned_options, options):
+    """Report the single points of failure of the strategy, with and without
+    the fallbacks, and of all usable items; write the analysis of the strategy
+    with fallbacks (what the runner will use) to the CSV file."""
+    print_report("strategy", Sensitivity(strategy_options))
+    planned = Sensitivity(planned_options)
+    print_report("strategy with fallbacks", planned)
+    print_report("all items", Sensitivity(options))
+    with open(fname, "w") as fp:
+        cw = csv.DictWriter(fp, FIELDNAMES)
+        cw.writeheader()
+        for row in planned.rows():
+            cw.writerow(row)
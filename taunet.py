@@ -0,0 +1,168 @@
+"""
+Shared HTTP client for the scripts that fetch pages from the game site or the
+Tau Tracker service.
+
+All requests go through one keep-alive session with a connection pool, a
+timeout, retries with backoff on connection errors and server errors, and a
+per-host rate limit (safe to use from several threads).
+
+The environment variable TAU_HTTP_MODE selects the mode:
+
+* live (default): fetch from the network
+* record: fetch from the network, and store each response in the archive
+* replay: serve the responses from the archive, without any network access
+
+The archive is a directory (TAU_HTTP_ARCHIVE, default 'http-archive') with one
+file per URL.  TAU_HTTP_RATE sets the rate limit in requests per second per host.
+TAU_SITE_URL overrides the game site (e.g. to test against a local server), and
+TAU_ITEM_URL and TAU_TRACKER_URL the URLs of the item pages and the tracker data.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# can be pointed elsewhere, e.g. to a local server for testing
+SITE_URL = os.environ.get('TAU_SITE_URL', "https://taustation.space").rstrip('/') + '/'
+ITEM_URL = os.environ.get('TAU_ITEM_URL', SITE_URL + "item/")
+TRACKER_URL = os.environ.get('TAU_TRACKER_URL', "https://tracker.tauguide.de/v1/special/fuel-vendor-correlation")
+
+# (connect, read) timeouts in seconds
+TIMEOUT = (5, 30)
+RETRIES = 3
+BACKOFF_FACTOR = 0.5
+POOL_SIZE = 16
+
+MODE = os.environ.get('TAU_HTTP_MODE', 'live')
+ARCHIVE = os.environ.get('TAU_HTTP_ARCHIVE', 'http-archive')
+# the same pace as the old get-items.sh, which slept 0.5s per item
+RATE = float(os.environ.get('TAU_HTTP_RATE', '2'))
+
+
+class ReplayMissing(requests.exceptions.ConnectionError):
+    """The URL isn't in the archive (in replay mode)."""
+
+
+class RecordedResponse:
+    """A response served from the archive, with the parts of the
+    requests.Response interface that the scripts use."""
+    def __init__(self, url, status_code, content, encoding='utf-8'):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.encoding = encoding
+    @property
+    def ok(self):
+        return self.status_code < 400
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+    def json(self):
+        return json.loads(self.text)
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        for i in range(0, len(self.content), chunk_size):
+            chunk = self.content[i:i+chunk_size]
+            yield chunk.decode(self.encoding or 'utf-8', errors='replace') if decode_unicode else chunk
+    def close(self):
+        pass
+
+
+class RateLimiter:
+    """Spaces the requests to each host at least 1/rate seconds apart."""
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_time = {}
+
+    def wait(self, host):
+        if not self.interval: return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time.get(host, now))
+            self.next_time[host] = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+_session = None
+_session_lock = threading.Lock()
+rate_limiter = RateLimiter(RATE)
+
+
+def session():
+    """The shared session, made on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(total=RETRIES, backoff_factor=BACKOFF_FACTOR,
+                          status_forcelist=(429, 500, 502, 503, 504), allowed_methods=('GET',),
+                          raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=retry)
+            s = requests.Session()
+            s.mount('https://', adapter)
+            s.mount('http://', adapter)
+            _session = s
+        return _session
+
+
+def archive_path(url):
+    return os.path.join(ARCHIVE, hashlib.sha1(url.encode()).hexdigest() + '.json')
+
+
+def load_recorded(url):
+    try:
+        with open(archive_path(url)) as fp:
+            rec = json.load(fp)
+    except FileNotFoundError:
+        raise ReplayMissing("not in the archive: " + url)
+    return RecordedResponse(url, rec['status'], rec['body'].encode(rec['encoding']), rec['encoding'])
+
+
+def store_recorded(url, response):
+    os.makedirs(ARCHIVE, exist_ok=True)
+    encoding = response.encoding or 'utf-8'
+    rec = { 'url': url, 'status': response.status_code, 'encoding': encoding,
+            'time': time.time(), 'body': response.content.decode(encoding, errors='replace') }
+    # write to a temporary file first, so concurrent readers never see half a file
+    path = archive_path(url)
+    tmp = '%s.%d.%d' % (path, os.getpid(), threading.get_ident())
+    with open(tmp, 'w') as fp:
+        json.dump(rec, fp)
+    os.replace(tmp, path)
+
+
+def get(url, stream=False):
+    """GET the URL, in the configured mode.  Returns a requests.Response (or a
+    RecordedResponse in replay mode), whatever the status code; raises
+    requests.RequestException if there is no response at all."""
+    if MODE == 'replay':
+        return load_recorded(url)
+    rate_limiter.wait(urlsplit(url).hostname)
+    response = session().get(url, timeout=TIMEOUT, stream=stream and MODE != 'record')
+    if MODE == 'record':
+        store_recorded(url, response)
+    return response
+
+
+def get_page(path, stream=False):
+    """GET a page of the game site; path can be relative to SITE_URL."""
+    return get(urljoin(SITE_URL, path), stream=stream)
+
+
+def get_item_page(slug, stream=False):
+    return get(ITEM_URL + slug, stream=stream)
+
+
+def get_tracker_json():
+    """The fuel/vendor correlation data from the Tau Tracker service."""
+    response = get(TRACKER_URL)
+    if response.status_code != 200:
+        raise Exception('Cannot get {}: {}'.format(TRACKER_URL, response.text))
+    return response.json()
@@ -0,0 +1,83 @@
+import csv
+import importlib.util
+import os
+import subprocess
+import sys
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(TESTS)
+FIXTURES = os.path.join(TESTS, 'fixtures')
+ARCHIVE = os.path.join(FIXTURES, 'http-archive')
+
+sys.path.insert(0, REPO)
+
+
+def fixture(*path):
+    return os.path.join(FIXTURES, *path)
+
+
+def load_script(name):
+    """Import one of the scripts (which have dashes in their names) as module."""
+    modname = name[:-3].replace('-', '_')
+    if modname in sys.modules:
+        return sys.modules[modname]
+    spec = importlib.util.spec_from_file_location(modname, os.path.join(REPO, name))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[modname] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_script(name, args=(), cwd=None, env=None, input=None):
+    """Run one of the scripts offline, serving its requests from the recorded
+    responses, and with a fixed hash seed so that the output is reproducible.
+    Further environment variables can be given in env, and its stdin in input.
+    Returns its stdout."""
+    base_env = dict(os.environ, PYTHONHASHSEED='0', TAU_HTTP_MODE='replay', TAU_HTTP_ARCHIVE=ARCHIVE)
+    for var in ('TAU_SITE_URL', 'TAU_ITEM_URL', 'TAU_TRACKER_URL'):
+        base_env.pop(var, None)
+    env = dict(base_env, **(env or {}))
+    result = subprocess.run([sys.executable, os.path.join(REPO, name)] + list(args), cwd=cwd, env=env,
+                            input=input, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def read_csv(fname):
+    with open(fname) as fp:
+        return list(csv.DictReader(fp))
+
+
+@pytest.fixture
+def replay(monkeypatch):
+    """Serve the requests of the imported modules from the recorded responses."""
+    import taunet
+    monkeypatch.setattr(taunet, 'MODE', 'replay')
+    monkeypatch.setattr(taunet, 'ARCHIVE', ARCHIVE)
+    monkeypatch.setattr(taunet, 'ITEM_URL', "https://taustation.space/item/")
+    monkeypatch.setattr(taunet, 'TRACKER_URL', "https://tracker.tauguide.de/v1/special/fuel-vendor-correlation")
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def site(tmp_path):
+    """A local stand-in for the game site, serving the files put into the
+    directory site.root at site.url."""
+    root = tmp_path / 'site'
+    root.mkdir()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(QuietHandler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield SimpleNamespace(root=root, url='http://127.0.0.1:%d/' % server.server_address[1])
+    server.shutdown()
+    server.server_close()
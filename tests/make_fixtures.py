@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Regenerate the recorded fixtures and golden outputs in tests/fixtures.
+
+The site is closed, so the item pages can't be recorded any more: they are
+made from the vendor prices in tau-vendors.csv (the price range of an item is
+the range of its recorded prices) and stored in the HTTP archive, the same
+way TAU_HTTP_MODE=record would.  The tracker data is a fixed sample of the
+vendor prices.  The golden outputs are what the scripts produce from these;
+only regenerate them after checking that a change in them is intended.
+
+Run from the top directory: python tests/make_fixtures.py
+"""
+
+import csv
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(TESTS)
+FIXTURES = os.path.join(TESTS, 'fixtures')
+ARCHIVE = os.path.join(FIXTURES, 'http-archive')
+
+sys.path.insert(0, REPO)
+import taunet
+
+# fraction of the vendor prices in the tracker sample
+SAMPLE = 0.2
+SEED = 1
+
+ITEM_PAGE = '''<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="utf-8"><title>%(slug)s — τ</title></head>
+<body>
+<div class="item-detailed-header"><h1>%(slug)s</h1></div>
+<div class="item-detailed-value">Value: <span class="currency">%(mn).2f - %(mx).2f</span> credits</div>
+</body>
+</html>
+'''
+
+
+def script_env():
+    env = dict(os.environ, PYTHONHASHSEED='0', TAU_HTTP_MODE='replay', TAU_HTTP_ARCHIVE=ARCHIVE)
+    env.pop('TAU_ITEM_URL', None)
+    env.pop('TAU_TRACKER_URL', None)
+    return env
+
+
+def run_script(name, args, cwd):
+    return subprocess.run([sys.executable, os.path.join(REPO, name)] + args, cwd=cwd, env=script_env(),
+                          check=True, capture_output=True, text=True).stdout
+
+
+def make_tracker_sample():
+    rows = [ r for r in csv.DictReader(open(os.path.join(REPO, 'tau-vendors.csv'))) if r['Currency'] == 'credits' ]
+    rnd = random.Random(SEED)
+    stations = {}
+    for r in rows:
+        if rnd.random() >= SAMPLE: continue
+        if not r['Station'] in stations:
+            stations[r['Station']] = {
+                'station': { 'name': r['Station'], 'system': r['System'], 'short': r['Station'][:10] },
+                'fuel_price_per_g': float(r['FuelPrice']),
+                'vendors': {}
+            }
+        vendors = stations[r['Station']]['vendors']
+        if not r['Vendor'] in vendors:
+            vendors[r['Vendor']] = {}
+        vendors[r['Vendor']][r['slug']] = float(r['ItemPrice'])
+    return list(stations.values())
+
+
+def record(url, body):
+    taunet.store_recorded(url, taunet.RecordedResponse(url, 200, body.encode('utf-8')))
+
+
+if __name__ == '__main__':
+    taunet.ARCHIVE = ARCHIVE
+    shutil.rmtree(ARCHIVE, ignore_errors=True)
+
+    tracker = make_tracker_sample()
+    with open(os.path.join(FIXTURES, 'tracker.json'), 'w') as fp:
+        json.dump(tracker, fp, indent=1, ensure_ascii=False)
+    record(taunet.TRACKER_URL, json.dumps(tracker))
+
+    prices = {}
+    for station_info in tracker:
+        for inventory in station_info['vendors'].values():
+            for slug, itemprice in inventory.items():
+                prices.setdefault(slug, []).append(itemprice)
+    for slug in sorted(prices):
+        record(taunet.ITEM_URL + slug, ITEM_PAGE % { 'slug': slug, 'mn': min(prices[slug]), 'mx': max(prices[slug]) })
+
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copy(os.path.join(REPO, 'tau-vendors.csv'), tmp)
+        run_script('get-fuel-price-strategy.py', [], tmp)
+        shutil.copy(os.path.join(tmp, 'fuel-price-strategy.csv'), os.path.join(FIXTURES, 'fuel-price-strategy.csv'))
+    with tempfile.TemporaryDirectory() as tmp:
+        run_script('get-fuel-price-strategy-from-tracker.py', [], tmp)
+        shutil.copy(os.path.join(tmp, 'fuel-price-strategy.csv'), os.path.join(FIXTURES, 'fuel-price-strategy-tracker.csv'))
+    with tempfile.TemporaryDirectory() as tmp:
+        run_script('estimate-fuel-price.py', ['-o', 'estimate.json', os.path.join(FIXTURES, 'tracker.json')], tmp)
+        shutil.copy(os.path.join(tmp, 'estimate.json'), os.path.join(FIXTURES, 'estimate.json'))
+    with tempfile.TemporaryDirectory() as tmp:
+        vendors = os.path.join(tmp, 'vendors')
+        shutil.copytree(os.path.join(FIXTURES, 'vendors'), vendors)
+        run_script('vendors-to-csv.py', sorted(os.listdir(vendors)), vendors)
+        shutil.copy(os.path.join(vendors, 'tau-vendors.csv'), os.path.join(FIXTURES, 'tau-vendors.csv'))
@@ -0,0 +1,81 @@
+import json
+import math
+import os
+import re
+import subprocess
+import sys
+
+from conftest import ARCHIVE, REPO, fixture, load_script, run_script
+
+
+def load_tracker_data(estimator):
+    with open(fixture('tracker.json')) as fp:
+        entries = estimator.read_items(json.load(fp))
+    entries_by_station = estimator.entries_by_key(entries, 'Station')
+    cleaned_entries_by_station = { station: estimator.entries_by_key(station_entries, 'slug')
+                                   for station, station_entries in entries_by_station.items() }
+    available_on_station_by_slug = {}
+    for e in entries:
+        available_on_station_by_slug.setdefault(e['slug'], set()).add(e['Station'])
+    return entries, cleaned_entries_by_station, available_on_station_by_slug
+
+
+def test_estimate_golden(tmp_path):
+    run_script('estimate-fuel-price.py', ['-o', 'estimate.json', fixture('tracker.json')], cwd=tmp_path)
+    with open(tmp_path / 'estimate.json') as fp:
+        result = json.load(fp)
+    with open(fixture('estimate.json')) as fp:
+        assert result == json.load(fp)
+
+
+def test_estimate_follows_cheapest_prediction(tmp_path):
+    # the reasoning goes to stderr
+    env = dict(os.environ, PYTHONHASHSEED='0', TAU_HTTP_MODE='replay', TAU_HTTP_ARCHIVE=ARCHIVE)
+    result = subprocess.run([sys.executable, os.path.join(REPO, 'estimate-fuel-price.py'), fixture('tracker.json')],
+                            cwd=tmp_path, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    output = result.stderr
+    predicted = re.search(r"predicted phase 1 lookups: (\d+) with plan, (\d+) greedy, (\d+) chosen without plan", output)
+    lookups = int(re.search(r"item lookups: (\d+)", output).group(1))
+    # the recorded prices are the current ones, so the prediction holds
+    assert lookups == min(int(n) for n in predicted.groups())
+
+
+def test_rank_likelihoods():
+    estimator = load_script('estimate-fuel-price.py')
+    entries, cleaned_entries_by_station, available_on_station_by_slug = load_tracker_data(estimator)
+    likelihoods = estimator.rank_likelihoods(cleaned_entries_by_station, available_on_station_by_slug)
+    for (station, slug), p in likelihoods.items():
+        assert math.isclose(sum(p), 1.0)
+        if len(available_on_station_by_slug[slug]) == 2:
+            assert p[2] == 0.0
+
+
+def test_plan_resolves_all_stations():
+    estimator = load_script('estimate-fuel-price.py')
+    entries, cleaned_entries_by_station, available_on_station_by_slug = load_tracker_data(estimator)
+    plan = estimator.plan_lookups(cleaned_entries_by_station, available_on_station_by_slug)
+    resolved = set()
+    for slug, stations in plan:
+        resolved |= stations
+    assert resolved == set(cleaned_entries_by_station)
+
+
+def test_phase1_in_order():
+    estimator = load_script('estimate-fuel-price.py')
+    entries, cleaned_entries_by_station, available_on_station_by_slug = load_tracker_data(estimator)
+    entries_by_station = estimator.entries_by_key(entries, 'Station')
+    predicted_ranges = estimator.predict_price_ranges(entries)
+    likelihoods = estimator.rank_likelihoods(cleaned_entries_by_station, available_on_station_by_slug)
+    greedy_slugs_by_station = { station: estimator.greedy_slug_order(cleaned_entries_by_station[station],
+                                                                     available_on_station_by_slug)
+                                for station in cleaned_entries_by_station }
+    fuelprice_by_station, considered_slugs_by_station, nconverged = estimator.phase1(
+        sorted(cleaned_entries_by_station), greedy_slugs_by_station, {}, predicted_ranges.__getitem__,
+        predicted_ranges, likelihoods, cleaned_entries_by_station, entries_by_station, available_on_station_by_slug,
+        in_order=True)
+    assert nconverged == len(cleaned_entries_by_station)
+    # the greedy baseline takes the items in the given order
+    for station, considered in considered_slugs_by_station.items():
+        positions = [ greedy_slugs_by_station[station].index(slug) for slug in considered ]
+        assert positions == sorted(positions)
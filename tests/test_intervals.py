@@ -0,0 +1,72 @@
+import math
+
+from intervals import Interval, WeightedIntervals, fpc_interval, price_range
+
+
+def test_rounded_covers_the_shown_price():
+    iv = Interval.rounded(12.34)
+    assert iv.contains(12.335) and iv.contains(12.344)
+    assert not iv.contains(12.33) and not iv.contains(12.35)
+
+
+def test_fpc_interval_contains_exact_ratio():
+    # fuel prices are shown with 1 decimal
+    fpc = fpc_interval(9634.28, 3133.4)
+    assert fpc.contains(9634.28 / 3133.4)
+    assert fpc.contains(9634.275 / 3133.449) and fpc.contains(9634.284 / 3133.35)
+    assert not fpc.contains(9634.28 / 3133.5)
+    # the fuel price can be recovered from the item price within the rounding
+    assert (Interval.rounded(9634.28) / fpc).contains(3133.4)
+
+
+def test_fpc_intervals_of_an_item_overlap():
+    # the same item on stations with different fuel prices: the exact FPC is
+    # the same, the observed ratios differ by the rounding
+    fuelprices = [ 31.34, 47.56, 3133.42 ]
+    fpc = 2.5678901
+    intervals = [ fpc_interval(round(fpc * fp, 2), round(fp, 1)) for fp in fuelprices ]
+    for iv in intervals:
+        assert iv.contains(fpc)
+        assert all(iv.overlaps(other) for other in intervals)
+
+
+def test_price_range_and_convergence():
+    fuelprice = price_range(100.0, 100.0) / fpc_interval(250.0, 100.0)
+    assert fuelprice.contains(40.0)
+    assert fuelprice.is_converged()
+    assert not (price_range(100.0, 120.0) / fpc_interval(250.0, 100.0)).is_converged()
+
+
+def test_intersect_and_overlaps():
+    a = Interval(1.0, 3.0)
+    assert a.intersect(Interval(2.0, 5.0)).min == 2.0
+    assert a.overlaps(Interval(3.0, 4.0))
+    assert not a.overlaps(Interval(3.5, 4.0))
+    assert a.intersect(Interval(3.5, 4.0)).is_empty()
+
+
+def test_weighted_intervals_unknown():
+    belief = WeightedIntervals()
+    assert not belief.is_known()
+    assert belief.spread() == math.inf
+    assert belief.estimate() == (None, 0.0)
+    assert not belief.bounds().is_bounded()
+
+
+def test_weighted_intervals_combine_prefers_agreement():
+    a = WeightedIntervals([(Interval(100.0, 100.01), 0.5), (Interval(120.0, 120.01), 0.5)])
+    b = WeightedIntervals([(Interval(120.005, 120.02), 0.5), (Interval(90.0, 130.0), 0.5)])
+    estimate, confidence = a.combine(b).estimate()
+    assert 120.0 <= estimate <= 120.01
+    assert confidence > 0.99
+    # contradicting evidence: the new one is taken
+    c = WeightedIntervals([(Interval(200.0, 201.0), 1.0)])
+    assert a.combine(c).bounds().min == 200.0
+
+
+def test_weighted_intervals_restrict():
+    belief = WeightedIntervals([(Interval(0.0, 10.0), 0.5), (Interval(20.0, 30.0), 0.5)])
+    restricted = belief.restrict(Interval(5.0, 25.0))
+    assert math.isclose(sum(w for iv, w in restricted.pieces), 1.0)
+    assert restricted.bounds().min == 5.0 and restricted.bounds().max == 25.0
+    assert belief.restrict(Interval(40.0, 50.0)).is_known() is False
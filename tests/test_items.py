@@ -0,0 +1,211 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+from glob import glob
+
+import pytest
+
+import item_archive
+import item_pages
+from item_records import format_value, make_record, parse_number, record_class
+
+from conftest import REPO, fixture, load_script, read_csv, run_script
+
+ITEM_PAGES = sorted(glob(fixture('items', '*.html')))
+
+
+def recorded_rows(typ):
+    return { row['slug']: row for row in read_csv(os.path.join(REPO, 'items', typ + '.csv')) }
+
+
+@pytest.mark.parametrize('page', ITEM_PAGES, ids=os.path.basename)
+def test_slurp_item(page, monkeypatch):
+    items_to_csv = load_script('items-to-csv.py')
+    # slurp_item takes the slug from the file name, relative to the items directory
+    monkeypatch.chdir(os.path.dirname(page))
+    record = make_record(items_to_csv.slurp_item(os.path.basename(page)))
+    row = recorded_rows(record.type)[record.slug]
+    assert record == record_class(record.type).from_dict(row)
+    assert { k: str(v) for k, v in record.to_row().items() } == row
+
+
+def test_items_to_csv_golden(tmp_path):
+    for page in ITEM_PAGES:
+        shutil.copy(page, tmp_path)
+    run_script('items-to-csv.py', cwd=tmp_path)
+    written = sorted(os.path.basename(f) for f in glob(str(tmp_path / '*.csv')))
+    assert written == ['Armor.csv', 'Food.csv', 'Medical.csv', 'Weapon.csv']
+    for fname in written:
+        recorded = recorded_rows(fname[:-4])
+        for row in read_csv(tmp_path / fname):
+            assert row == recorded[row['slug']]
+
+
+@pytest.mark.parametrize('chunk_size', [7, 64, item_pages.CHUNK_SIZE])
+def test_price_extraction_matches_full_parser(chunk_size):
+    for page in ITEM_PAGES:
+        with open(page, 'rb') as fp:
+            data = fp.read()
+        chunks = [ data[i:i+chunk_size] for i in range(0, len(data), chunk_size) ]
+        price_range, scanned = item_pages.scan_price_range(chunks)
+        assert price_range is not None
+        assert price_range == item_pages.parse_price_range(data)
+
+
+@pytest.mark.parametrize('chunk_size', [5, 100, 600])
+def test_price_extraction_long_span(chunk_size):
+    # an opening tag longer than a chunk, and a character reference in the price
+    data = (b'<html><body>' + b'<span class="x"></span>' * 50 + b'<span data-x="' + b'y' * 1000
+            + b'" class="currency">1&#44;234.56 - 1,300.00</span></body></html>')
+    chunks = [ data[i:i+chunk_size] for i in range(0, len(data), chunk_size) ]
+    assert item_pages.scan_price_range(chunks)[0] == (1234.56, 1300.0)
+    assert item_pages.parse_price_range(data) == (1234.56, 1300.0)
+
+
+def test_price_extraction_falls_back():
+    html = b'<html><body><span class="currency"><b>1.00 - 2.00</b></span></body></html>'
+    assert item_pages.scan_price_range([html])[0] is None
+    assert item_pages.price_range_from_chunks([html]) is None
+    assert item_pages.price_range_from_chunks([b'<html><body>no price</body></html>']) is None
+
+
+def test_get_price_range_replayed(replay):
+    # the recorded item pages show the price range over the tracker's vendors
+    with open(fixture('tracker.json')) as fp:
+        tracker = json.load(fp)
+    prices = {}
+    for station_info in tracker:
+        for inventory in station_info['vendors'].values():
+            for slug, price in inventory.items():
+                prices.setdefault(slug, []).append(price)
+    for slug in sorted(prices)[:10]:
+        assert item_pages.get_price_range(slug) == (min(prices[slug]), max(prices[slug]))
+    with pytest.raises(Exception):
+        item_pages.get_price_range('no-such-item')
+
+
+def test_item_archive(tmp_path):
+    pages = {}
+    for page in ITEM_PAGES:
+        with open(page, 'rb') as fp:
+            pages[os.path.basename(page)[:-5]] = fp.read()
+    archivefile = str(tmp_path / 'items.archive')
+    first = sorted(pages)[:2]
+    item_archive.write_archive(archivefile, first, pages.__getitem__)
+    assert item_archive.update_archive(archivefile, sorted(pages)[2:], pages.__getitem__) == len(pages)
+    with item_archive.ItemArchive(archivefile) as archive:
+        assert len(archive) == len(pages)
+        assert archive.slugs() == sorted(pages)
+        for slug, page in pages.items():
+            assert slug in archive and archive[slug] == page
+        assert 'no-such-item' not in archive and archive.get('no-such-item') is None
+        assert dict(archive.pages()) == pages
+
+
+def test_item_archive_append(tmp_path):
+    pages = {}
+    for page in ITEM_PAGES:
+        with open(page, 'rb') as fp:
+            pages[os.path.basename(page)[:-5]] = fp.read()
+    slugs = sorted(pages)
+    archivefile = str(tmp_path / 'items.archive')
+    item_archive.write_archive(archivefile, slugs[1:], pages.__getitem__)
+    with open(archivefile, 'rb') as fp:
+        written = fp.read()
+    with item_archive.ItemArchive(archivefile) as archive:
+        table_off = archive.table_off
+    # one new page and one replaced: appended, the pages written before stay as they are
+    changed = dict(pages, **{ slugs[1]: pages[slugs[1]].replace(b'</html>', b'<!-- changed --></html>') })
+    assert item_archive.update_archive(archivefile, slugs[:2], changed.__getitem__) == len(pages)
+    with open(archivefile, 'rb') as fp:
+        appended = fp.read()
+    assert appended[item_archive.HEADER.size:table_off] == written[item_archive.HEADER.size:table_off]
+    with item_archive.ItemArchive(archivefile) as archive:
+        assert archive.slugs() == slugs
+        assert dict(archive.pages()) == changed
+        assert archive.unused() > 0
+    # an empty file is no archive
+    open(tmp_path / 'empty.archive', 'w').close()
+    with pytest.raises(item_archive.ArchiveError):
+        item_archive.ItemArchive(str(tmp_path / 'empty.archive'))
+
+
+def test_items_to_csv_from_archive(tmp_path):
+    itemdir = tmp_path / 'items'
+    itemdir.mkdir()
+    for page in ITEM_PAGES:
+        shutil.copy(page, itemdir)
+    run_script('item-archive.py', ['pack', 'items'], cwd=tmp_path)
+    run_script('items-to-csv.py', ['items.archive'], cwd=tmp_path)
+    run_script('items-to-csv.py', cwd=itemdir)
+    written = sorted(os.path.basename(f) for f in glob(str(tmp_path / '*.csv')))
+    assert written == ['Armor.csv', 'Food.csv', 'Medical.csv', 'Weapon.csv']
+    for fname in written:
+        assert read_csv(tmp_path / fname) == read_csv(itemdir / fname)
+
+
+def test_get_items_into_archive(tmp_path):
+    with open(fixture('tracker.json')) as fp:
+        tracker = json.load(fp)
+    slugs = sorted(set(slug for station_info in tracker for inventory in station_info['vendors'].values()
+                       for slug in inventory))[:5]
+    output = run_script('get-items.py', ['--archive', 'items.archive'], cwd=tmp_path,
+                        input='\n'.join(slugs[:3]) + '\n')
+    assert output.split() == slugs[:3]
+    # only the new ones are downloaded
+    output = run_script('get-items.py', ['--archive', 'items.archive'], cwd=tmp_path,
+                        input='\n'.join(slugs) + '\n')
+    assert output.split() == slugs[3:]
+    with item_archive.ItemArchive(str(tmp_path / 'items.archive')) as archive:
+        assert archive.slugs() == slugs
+        assert item_pages.price_range_from_chunks([archive[slugs[0]]]) is not None
+    assert not os.path.exists(tmp_path / 'items')
+
+
+def test_item_query_yesno(tmp_path):
+    args = ['-t', 'Weapon', '-f', 'slug,hand-to-hand', '--cache', str(tmp_path / 'item-tables.cache')]
+    melee = read_csv(os.path.join(REPO, 'items', 'Weapon.csv'))
+    melee = sorted(row['slug'] for row in melee if row['hand-to-hand'] == 'Yes')
+    for value in ('Yes', 'True'):
+        output = run_script('item-query.py', args + ['-w', 'hand-to-hand=' + value], cwd=REPO)
+        lines = output.splitlines()
+        assert lines[0] == 'slug,hand-to-hand'
+        assert sorted(line.split(',')[0] for line in lines[1:]) == melee
+        assert all(line.endswith(',Yes') for line in lines[1:])
+
+
+def test_item_catalogue_list(tmp_path):
+    catalogue = ['-f', str(tmp_path / 'item-catalogue.sqlite')]
+    run_script('item-catalogue.py', catalogue + ['add', 'vendors'], cwd=tmp_path, input="a\nb\nc\n")
+    run_script('item-catalogue.py', catalogue + ['add', 'tauhead'], cwd=tmp_path, input="a\nc\nd\n")
+    # each slug once, however many sources know it
+    assert run_script('item-catalogue.py', catalogue + ['list', 'vendors', 'tauhead'], cwd=tmp_path).split() \
+        == ['a', 'b', 'c', 'd']
+    assert run_script('item-catalogue.py', catalogue + ['list'], cwd=tmp_path).split() == ['a', 'b', 'c', 'd']
+    assert run_script('item-catalogue.py', catalogue + ['list', 'vendors', '--not', 'tauhead'], cwd=tmp_path).split() \
+        == ['b']
+    output = run_script('item-catalogue.py', catalogue + ['show', 'a'], cwd=tmp_path)
+    assert [ line.split()[0] for line in output.splitlines() ] == ['tauhead', 'vendors']
+
+
+def test_format_value_round_trips():
+    for value in (0.0, 1.7, 0.031, 1234567.89, 98765.4321, 1e-05):
+        assert parse_number(format_value(value)) == value
+    assert format_value(3.0) == '3' and format_value(True) == 'Yes' and format_value(None) == ''
+
+
+@pytest.mark.parametrize('args, error', [
+    (['-w', 'weight<abc'], "invalid value for weight"),
+    (['-w', 'hand-to-hand=maybe'], "invalid value for hand-to-hand"),
+    (['-w', 'no-such-field<1'], "unknown field: no-such-field"),
+    (['-s', 'no-such-field'], "unknown field: no-such-field"),
+    (['-f', 'slug,no-such-field'], "unknown field: no-such-field"),
+])
+def test_item_query_errors(tmp_path, args, error):
+    result = subprocess.run([sys.executable, os.path.join(REPO, 'item-query.py'), '-t', 'Weapon',
+                             '--cache', str(tmp_path / 'item-tables.cache')] + args,
+                            cwd=REPO, capture_output=True, text=True)
+    assert result.returncode == 2
+    assert error in result.stderr
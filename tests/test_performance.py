@@ -0,0 +1,163 @@
+"""
+Benchmarks of the hot paths, run with the rest of the tests when
+pytest-benchmark is installed.  Compare runs with
+
+    python -m pytest tests/test_performance.py --benchmark-autosave
+    python -m pytest tests/test_performance.py --benchmark-compare
+"""
+
+import json
+import os
+from glob import glob
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+import item_archive
+import item_pages
+import item_tables
+import strategy_analysis
+import vendor_pages
+from intervals import Interval, WeightedIntervals, fpc_interval, price_range
+from item_records import make_record
+
+from conftest import REPO, fixture, load_script
+
+
+@pytest.fixture(scope='module')
+def vendor_entries():
+    strategy = load_script('get-fuel-price-strategy.py')
+    return strategy.read_items(os.path.join(REPO, 'tau-vendors.csv'))
+
+
+@pytest.fixture(scope='module')
+def item_rows():
+    return [ row for f in sorted(glob(os.path.join(REPO, 'items', '*.csv'))) for row in item_tables.read_csv(f) ]
+
+
+def test_bench_fpc_intervals(benchmark, vendor_entries):
+    def fuelprices():
+        return [ price_range(float(e['ItemPrice']), float(e['ItemPrice']))
+                 / fpc_interval(float(e['ItemPrice']), float(e['FuelPrice'])) for e in vendor_entries ]
+    assert len(benchmark(fuelprices)) == len(vendor_entries)
+
+
+def test_bench_weighted_combine(benchmark):
+    a = WeightedIntervals([ (Interval(100.0 + i, 100.5 + i), 1.0) for i in range(8) ])
+    b = WeightedIntervals([ (Interval(100.25 + 2*i, 100.75 + 2*i), 1.0) for i in range(8) ])
+    assert benchmark(a.combine, b).is_known()
+
+
+def test_bench_strategy_update(benchmark, vendor_entries):
+    strategy = load_script('get-fuel-price-strategy.py')
+
+    def update_all():
+        strategies = {}
+        for e in vendor_entries:
+            station = e['Station']
+            if not station in strategies: strategies[station] = strategy.Strategy(station)
+            strategies[station].update(e)
+        return strategies
+    assert len(benchmark(update_all)) > 0
+
+
+def test_bench_sensitivity(benchmark, vendor_entries):
+    strategy = load_script('get-fuel-price-strategy.py')
+    slug_entries = strategy.entries_by_key(vendor_entries, 'slug')
+    unique_slugs = [ slug for slug,se in slug_entries.items() if len(se)==1 ]
+    dual_slugs = [ slug for slug,se in slug_entries.items() if len(se)==2 ]
+    options = strategy_analysis.station_options(slug_entries, unique_slugs, dual_slugs)
+    assert len(benchmark(strategy_analysis.Sensitivity, options).depths) == 24
+
+
+def test_bench_slurp_vendor(benchmark):
+    page = fixture('vendors', 'Sol', 'Tau Station', 'benevolent-dynamics.html')
+    assert len(benchmark(vendor_pages.slurp_vendor, page, 'Sol')) == 6
+
+
+def test_bench_slurp_item(benchmark, monkeypatch):
+    items_to_csv = load_script('items-to-csv.py')
+    monkeypatch.chdir(fixture('items'))
+    assert benchmark(items_to_csv.slurp_item, 'g-4.html')['slug'] == 'g-4'
+
+
+@pytest.mark.parametrize('extract', ['scan', 'parse'])
+def test_bench_price_extraction(benchmark, extract):
+    with open(fixture('items', 'spiked-leather-jacket.html'), 'rb') as fp:
+        data = fp.read()
+    chunks = [ data[i:i+item_pages.CHUNK_SIZE] for i in range(0, len(data), item_pages.CHUNK_SIZE) ]
+    if extract == 'scan':
+        assert benchmark(item_pages.scan_price_range, chunks)[0] is not None
+    else:
+        assert benchmark(item_pages.parse_price_range, data) is not None
+
+
+def test_bench_vendor_anomalies(benchmark):
+    anomalies = load_script('vendor-anomalies.py')
+    entries = anomalies.read_csv_entries(os.path.join(REPO, 'tau-vendors.csv'))
+    distribution, markups, ambiguous, outliers, ratios, stale = benchmark(anomalies.analyse, entries)
+    assert not stale
+
+
+def test_bench_plan_lookups(benchmark):
+    estimator = load_script('estimate-fuel-price.py')
+    with open(fixture('tracker.json')) as fp:
+        entries = estimator.read_items(json.load(fp))
+    cleaned_entries_by_station = { station: estimator.entries_by_key(station_entries, 'slug')
+                                   for station, station_entries in estimator.entries_by_key(entries, 'Station').items() }
+    available_on_station_by_slug = {}
+    for e in entries:
+        available_on_station_by_slug.setdefault(e['slug'], set()).add(e['Station'])
+    assert benchmark(estimator.plan_lookups, cleaned_entries_by_station, available_on_station_by_slug)
+
+
+def test_bench_item_tables(benchmark, item_rows):
+    records = [ make_record(row) for row in item_rows ]
+
+    def build_and_select():
+        table = item_tables.Table(records)
+        return table.select(type='Weapon', tier=2)
+    assert benchmark(build_and_select)
+
+
+def test_bench_changelog_slugs(benchmark, tmp_path, item_rows):
+    changelog = load_script('changelog-items.py')
+    fname = tmp_path / 'changelog.html'
+    with open(fname, 'w') as fp:
+        fp.write('<html><body><ul>\n')
+        for row in item_rows:
+            fp.write('<li>Changed <a href="https://taustation.space/item/%s">%s</a></li>\n'
+                     % (row['slug'], row['name']))
+        fp.write('</ul></body></html>\n')
+    assert len(benchmark(changelog.extract_slugs, fname)) == len(item_rows)
+
+
+@pytest.mark.parametrize('source', ['files', 'archive'])
+def test_bench_read_item_pages(benchmark, tmp_path, source):
+    # a mirror of a few hundred pages, from copies of the fixture pages
+    pages = {}
+    for page in sorted(glob(fixture('items', '*.html'))):
+        with open(page, 'rb') as fp:
+            html = fp.read()
+        for i in range(100):
+            pages['%s-%d' % (os.path.basename(page)[:-5], i)] = html
+    if source == 'files':
+        for slug, html in pages.items():
+            with open(tmp_path / (slug + '.html'), 'wb') as fp:
+                fp.write(html)
+
+        def read_all():
+            result = {}
+            for f in sorted(glob(str(tmp_path / '*.html'))):
+                with open(f, 'rb') as fp:
+                    result[os.path.basename(f)[:-5]] = fp.read()
+            return result
+    else:
+        archivefile = str(tmp_path / 'items.archive')
+        item_archive.write_archive(archivefile, pages, pages.__getitem__)
+
+        def read_all():
+            with item_archive.ItemArchive(archivefile) as archive:
+                return dict(archive.pages())
+    assert benchmark(read_all) == pages
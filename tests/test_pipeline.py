@@ -0,0 +1,94 @@
+import os
+import shutil
+
+import pytest
+
+from conftest import fixture, load_script, run_script
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return load_script('pipeline.py')
+
+
+def copy_script(name, tmp_path):
+    """A script for a test stage: copies its argument files into the last one."""
+    with open(tmp_path / name, 'w') as fp:
+        fp.write("import sys\n"
+                 "data = ''.join(open(f).read() for f in sys.argv[1:-1])\n"
+                 "if 'FAIL' in data: sys.exit(1)\n"
+                 "open(sys.argv[-1], 'w').write(data)\n")
+    return str(tmp_path / name)
+
+
+def stages(pipeline, tmp_path):
+    script = copy_script('copy.py', tmp_path)
+    Stage = pipeline.Stage
+    return [
+        Stage('b', script, args=['a.txt', 'b.txt'], inputs=['a.txt'], outputs=['b.txt']),
+        Stage('c', script, args=['b.txt', 'c.txt'], inputs=['b.txt'], outputs=['c.txt']),
+        Stage('y', script, args=['x.txt', 'y.txt'], inputs=['x.txt'], outputs=['y.txt']),
+        Stage('z', script, args=['c.txt', 'y.txt', 'z.txt'], inputs=['c.txt', 'y.txt'], outputs=['z.txt']),
+        ]
+
+
+def run(pipeline, stages, **kwargs):
+    results = pipeline.run_pipeline(stages, log=lambda msg: None, **kwargs)
+    return { name: r['status'] for name, r in results.items() }
+
+
+def test_pipeline_runs_changed_stages(pipeline, tmp_path):
+    open('a.txt', 'w').write("a\n")
+    open('x.txt', 'w').write("x\n")
+    st = stages(pipeline, tmp_path)
+    assert pipeline.upstream(st) == { 'b': [], 'c': ['b'], 'y': [], 'z': ['c', 'y'] }
+    assert run(pipeline, st) == { 'b': 'ran', 'c': 'ran', 'y': 'ran', 'z': 'ran' }
+    assert open('z.txt').read() == "a\nx\n"
+    assert run(pipeline, st) == { 'b': 'up to date', 'c': 'up to date', 'y': 'up to date', 'z': 'up to date' }
+    # only the stages after a changed input run
+    open('x.txt', 'w').write("x2\n")
+    assert run(pipeline, st) == { 'b': 'up to date', 'c': 'up to date', 'y': 'ran', 'z': 'ran' }
+    # a changed output is made again
+    open('c.txt', 'w').write("changed\n")
+    assert run(pipeline, st) == { 'b': 'up to date', 'c': 'ran', 'y': 'up to date', 'z': 'up to date' }
+    assert run(pipeline, st, force={'b'})['b'] == 'ran'
+    # the same content doesn't make the following stages run
+    open('a.txt', 'w').write("a\n")
+    os.utime('a.txt', (0, 0))
+    assert run(pipeline, st)['b'] == 'up to date'
+
+
+def test_pipeline_failure_blocks_dependents(pipeline, tmp_path):
+    open('a.txt', 'w').write("FAIL\n")
+    open('x.txt', 'w').write("x\n")
+    st = stages(pipeline, tmp_path)
+    assert run(pipeline, st) == { 'b': 'failed', 'c': 'blocked', 'y': 'ran', 'z': 'blocked' }
+    open('a.txt', 'w').write("a\n")
+    assert run(pipeline, st) == { 'b': 'ran', 'c': 'ran', 'y': 'up to date', 'z': 'ran' }
+
+
+def test_pipeline_missing_input(pipeline, tmp_path):
+    st = stages(pipeline, tmp_path)
+    open('x.txt', 'w').write("x\n")
+    open('c.txt', 'w').write("c\n")
+    assert run(pipeline, st) == { 'b': 'no input', 'c': 'no input', 'y': 'ran', 'z': 'ran' }
+    assert pipeline.select(st, ['c']) == st[:2]
+
+
+def test_pipeline_vendor_chain(tmp_path):
+    for system in os.listdir(fixture('vendors')):
+        shutil.copytree(fixture('vendors', system), tmp_path / system)
+    output = run_script('pipeline.py', ['strategy', 'vendor-slugs'], cwd=tmp_path)
+    for stage in ('vendors', 'strategy', 'vendor-slugs'):
+        assert "%-16s %-12s" % (stage, 'ran') in output
+    assert (tmp_path / 'fuel-price-strategy.csv').exists()
+    output = run_script('pipeline.py', ['strategy', 'vendor-slugs'], cwd=tmp_path)
+    for stage in ('vendors', 'strategy', 'vendor-slugs'):
+        assert "%-16s %-12s" % (stage, 'up to date') in output
+    # a new fuel price changes the vendor data
+    with open(tmp_path / 'Sol' / 'Tau Station' / 'fuel-price', 'w') as fp:
+        fp.write("436.0\n")
+    output = run_script('pipeline.py', ['strategy', 'vendor-slugs'], cwd=tmp_path)
+    for stage in ('vendors', 'strategy', 'vendor-slugs'):
+        assert "%-16s %-12s" % (stage, 'ran') in output
@@ -0,0 +1,218 @@
+import csv
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+
+import strategy_analysis
+from intervals import Interval
+
+from conftest import REPO, fixture, load_script, read_csv, run_script
+
+
+def entry(slug, station, fpc):
+    return { 'slug': slug, 'Station': station, 'FuelPriceCoefficient': fpc }
+
+
+def test_strategy_update_ranks_candidates():
+    strategy = load_script('get-fuel-price-strategy.py')
+    strat = strategy.Strategy('A')
+    for i, fpc in enumerate([1.0, 3.0, 2.0, 5.0, 4.0]):
+        strat.update(entry('item-%d' % i, 'A', fpc))
+    assert [ c['fpc'] for c in strat.candidates ] == [5.0, 4.0, 3.0, 2.0]
+    assert strat.slug == 'item-3' and strat.fpc == 5.0 and strat.parent is None
+
+
+def test_strategy_update_keeps_lowest_level():
+    strategy = load_script('get-fuel-price-strategy.py')
+    strat = strategy.Strategy('A')
+    strat.update(entry('far', 'A', 9.0), entry('far', 'C', 9.0), 2)
+    strat.update(entry('near', 'A', 1.0), entry('near', 'B', 1.0), 1)
+    assert strat.level == 1
+    assert [ c['slug'] for c in strat.candidates ] == ['near']
+    # a higher level doesn't replace anything
+    strat.update(entry('far', 'A', 9.0), entry('far', 'C', 9.0), 2)
+    assert strat.parent == 'B'
+
+
+def test_strategy_golden(tmp_path):
+    shutil.copy(os.path.join(REPO, 'tau-vendors.csv'), tmp_path)
+    run_script('get-fuel-price-strategy.py', cwd=tmp_path)
+    assert read_csv(tmp_path / 'fuel-price-strategy.csv') == read_csv(fixture('fuel-price-strategy.csv'))
+
+
+def test_strategy_matches_committed(tmp_path):
+    # the golden above only pins the current output; the strategy committed in the repo
+    # (made by the original script, from slightly different prices) is the reference
+    shutil.copy(os.path.join(REPO, 'tau-vendors.csv'), tmp_path)
+    run_script('get-fuel-price-strategy.py', cwd=tmp_path)
+    rows = read_csv(tmp_path / 'fuel-price-strategy.csv')
+    committed = { row['Station']: row for row in read_csv(os.path.join(REPO, 'fuel-price-strategy.csv')) }
+    best = { row['Station']: row for row in rows if row['Rank'] == '0' }
+    assert sorted(best) == sorted(committed)
+    def depth(strategy, station):
+        parent = strategy[station]['OtherStation']
+        return 1 + depth(strategy, parent) if parent else 0
+    for station, row in best.items():
+        expected = committed[station]
+        assert depth(best, station) == depth(committed, station)
+        if (row['slug'], row['OtherStation']) == (expected['slug'], expected['OtherStation']):
+            assert abs(float(row['FuelPriceCoefficient']) / float(expected['FuelPriceCoefficient']) - 1.0) < 1e-3
+        else:
+            # stations resolved in the same pass are visited in hash order, so whether
+            # a parent was already resolved can differ; then the committed choice is
+            # still one of the candidates of the same level
+            candidates = [ (r['slug'], r['OtherStation']) for r in rows
+                           if r['Station'] == station and int(r['Rank']) < 4 ]
+            assert (expected['slug'], expected['OtherStation']) in candidates
+
+
+def test_strategy_from_tracker_golden(tmp_path):
+    run_script('get-fuel-price-strategy-from-tracker.py', cwd=tmp_path)
+    assert read_csv(tmp_path / 'fuel-price-strategy.csv') == read_csv(fixture('fuel-price-strategy-tracker.csv'))
+
+
+def test_run_strategy_replayed(tmp_path):
+    shutil.copy(fixture('fuel-price-strategy-tracker.csv'), tmp_path / 'fuel-price-strategy.csv')
+    output = run_script('run-fuel-price-strategy.py', ['-j', '4'], cwd=tmp_path)
+    # the item pages were recorded with the tracker's fuel prices
+    with open(fixture('tracker.json')) as fp:
+        tracker = json.load(fp)
+    for station_info in tracker:
+        line = "%8.2f  %s" % (station_info['fuel_price_per_g'], station_info['station']['name'])
+        assert line in output.splitlines()
+    assert "unknown" not in output
+
+
+def test_read_legacy_strategy():
+    runner = load_script('run-fuel-price-strategy.py')
+    strategies = runner.sort_by_level(runner.read_strategy(os.path.join(REPO, 'fuel-price-strategy.csv')))
+    stations = [ station for station, candidates in strategies ]
+    assert len(stations) == len(set(stations))
+    # each station comes after the station it compares with
+    for i, (station, candidates) in enumerate(strategies):
+        parent = candidates[0]['OtherStation']
+        if parent:
+            assert parent in stations[:i]
+
+
+def test_fallbacks_remove_single_points_of_failure():
+    a1, b1 = entry('a1', 'A', 1.0), entry('b1', 'B', 1.0)
+    ca, ac = entry('ca', 'C', 2.0), entry('ca', 'A', 2.0)
+    cb, bc = entry('cb', 'C', 1.5), entry('cb', 'B', 1.5)
+    options = { 'A': [(a1, None), (ac, ca)], 'B': [(b1, None), (bc, cb)], 'C': [(ca, ac), (cb, bc)] }
+    assert strategy_analysis.resolve(options) == { 'A': 0, 'B': 0, 'C': 1 }
+    assert strategy_analysis.resolve(options, failed_slugs={'ca'}, failed_stations={'B'}) == { 'A': 0 }
+    strategy_options = { 'A': [(a1, None)], 'B': [(b1, None)], 'C': [(ca, ac)] }
+    sensitivity = strategy_analysis.Sensitivity(strategy_options)
+    assert sensitivity.critical_slugs['C'] == ['a1', 'ca']
+    assert sensitivity.critical_stations['C'] == ['A']
+    assert sensitivity.dependents('A') == ['C']
+    # the fallback uses the other parent
+    candidates = [ { 'slug': 'ca', 'parent': 'A' } ]
+    fallbacks = strategy_analysis.fallbacks('C', options, ['A', 'B', 'C'], candidates)
+    assert fallbacks == [(cb, bc)]
+    # but only parents resolved earlier
+    assert strategy_analysis.fallbacks('A', options, ['A', 'B', 'C'], [ { 'slug': 'a1', 'parent': None } ]) == []
+    planned = { 'A': [(a1, None)], 'B': [(b1, None)], 'C': [(ca, ac)] + fallbacks }
+    sensitivity = strategy_analysis.Sensitivity(planned)
+    assert sensitivity.critical_slugs['C'] == []
+    assert sensitivity.critical_stations['C'] == []
+
+
+def test_sensitivity_report(tmp_path):
+    shutil.copy(os.path.join(REPO, 'tau-vendors.csv'), tmp_path)
+    output = run_script('get-fuel-price-strategy.py', ['--report'], cwd=tmp_path)
+    assert "Single points of failure, all items: 0 of 24 stations" in output
+    rows = read_csv(tmp_path / 'fuel-price-sensitivity.csv')
+    assert len(rows) == 24
+    depths = { row['Station']: int(row['Depth']) for row in rows }
+    for row in rows:
+        assert int(row['Candidates']) > 0
+        for parent in row['Parents'].split('; ') if row['Parents'] else ():
+            assert parent in depths
+        if row['Depth'] == '0':
+            assert not row['CriticalStations']
+    # the strategy file is the same as without the report
+    assert read_csv(tmp_path / 'fuel-price-strategy.csv') == read_csv(fixture('fuel-price-strategy.csv'))
+
+
+def test_run_strategy_falls_back(tmp_path):
+    # the primary candidates of one station can't be looked up
+    rows = read_csv(fixture('fuel-price-strategy-tracker.csv'))
+    station = next(row['Station'] for row in rows if row['OtherStation'])
+    primaries = set(row['slug'] for row in rows if row['Station'] == station and int(row['Rank']) < 4)
+    for row in rows:
+        if row['slug'] in primaries:
+            row['slug'] = 'no-such-item'
+    with open(tmp_path / 'fuel-price-strategy.csv', 'w') as fp:
+        cw = csv.DictWriter(fp, list(rows[0]))
+        cw.writeheader()
+        cw.writerows(rows)
+    output = run_script('run-fuel-price-strategy.py', cwd=tmp_path)
+    with open(fixture('tracker.json')) as fp:
+        tracker = json.load(fp)
+    fuelprice = next(s['fuel_price_per_g'] for s in tracker if s['station']['name'] == station)
+    assert "%8.2f  %s" % (fuelprice, station) in output.splitlines()
+    assert "unknown" not in output
+
+
+def test_try_candidate_single_price(monkeypatch):
+    runner = load_script('run-fuel-price-strategy.py')
+    monkeypatch.setattr(runner, 'current', threading.local())
+    runner.current.lines = []
+    runner.current.fetch_time = 0.0
+    # the item page shows a single price, which matches the other station at both ends
+    monkeypatch.setattr(runner, 'price_ranges', { 'x': (100.0, 100.0) })
+    strat = { 'slug': 'x', 'OtherStation': 'B', 'ItemPrice': '100.0', 'FuelPrice': '40.0',
+              'OtherItemPrice': '100.0', 'OtherFuelPrice': '40.0' }
+    fuel_prices = { 'B': Interval.rounded(40.0, 1) }
+    fp = runner.try_candidate('A', strat, fuel_prices)
+    assert fp is not None and fp.contains(40.0)
+    assert not runner.current.lines
+
+
+def test_resolve_station_skips_lookup_for_unknown_parent(monkeypatch):
+    runner = load_script('run-fuel-price-strategy.py')
+    looked_up = []
+    monkeypatch.setattr(runner.item_pages, 'get_price_range', lambda slug: looked_up.append(slug) or (1.0, 2.0))
+    monkeypatch.setattr(runner, 'price_ranges', {})
+    candidates = [ { 'slug': 'x', 'OtherStation': 'B', 'ItemPrice': '100.0', 'FuelPrice': '40.0',
+                     'OtherItemPrice': '100.0', 'OtherFuelPrice': '40.0' } ]
+    result = runner.resolve_station('A', candidates, {}, 0.0)
+    assert looked_up == []
+    assert any("not known" in line for line in result['lines'])
+
+
+def test_run_strategy_malformed_line(tmp_path):
+    # a malformed line only makes its own station unknown
+    rows = read_csv(fixture('fuel-price-strategy-tracker.csv'))
+    station = next(row['Station'] for row in rows if not row['OtherStation'])
+    dependents = set(row['Station'] for row in rows if row['OtherStation'] == station)
+    for row in rows:
+        if row['Station'] == station:
+            row['ItemPrice'] = row['FuelPriceCoefficient'] = 'abc'
+    with open(tmp_path / 'fuel-price-strategy.csv', 'w') as fp:
+        cw = csv.DictWriter(fp, list(rows[0]))
+        cw.writeheader()
+        cw.writerows(rows)
+    output = run_script('run-fuel-price-strategy.py', cwd=tmp_path)
+    assert "WARNING: failed to resolve %s" % station in output
+    assert "%8s  %s" % ("unknown", station) in output.splitlines()
+    with open(fixture('tracker.json')) as fp:
+        tracker = json.load(fp)
+    for station_info in tracker:
+        name = station_info['station']['name']
+        if name != station and not name in dependents:
+            assert "%8.2f  %s" % (station_info['fuel_price_per_g'], name) in output.splitlines()
+
+
+def test_run_strategy_empty(tmp_path):
+    with open(tmp_path / 'fuel-price-strategy.csv', 'w') as fp:
+        fp.write("Station,Rank,slug,FuelPriceCoefficient,OtherStation,OtherFPC\n")
+    assert "wall time" in run_script('run-fuel-price-strategy.py', cwd=tmp_path)
+    result = subprocess.run([sys.executable, os.path.join(REPO, 'run-fuel-price-strategy.py'), '-j'],
+                            cwd=tmp_path, capture_output=True, text=True)
+    assert result.returncode == 2 and "usage" in result.stderr
@@ -0,0 +1,168 @@
+import csv
+import json
+import os
+import shutil
+import subprocess
+import sys
+from glob import glob
+
+import vendor_pages
+from intervals import fuelprice_interval
+
+from conftest import REPO, fixture, load_script, read_csv, run_script
+
+
+def test_slurp_vendor():
+    items = vendor_pages.slurp_vendor(fixture('vendors', 'Alpha Centauri', 'Cirque Centauri',
+                                             'friendly-robotical-scavenge.html'), 'Alpha Centauri')
+    assert len(items) == 6
+    knife = items[0]
+    assert knife['slug'] == 'cane-knife'
+    assert knife['ItemName'] == 'Cane Knife'
+    assert knife['ItemPrice'] == '9634.28'   # shown as 9,634.28
+    assert knife['Currency'] == 'credits'
+    assert knife['Category'] == 'Weapon'
+    assert knife['Vendor'] == 'Friendly Robotical Scavenge'
+    assert knife['Station'] == 'Cirque Centauri'
+    assert knife['FuelPrice'] == '3133.4'
+    assert [ i['Currency'] for i in items ].count('bonds') == 1
+
+
+def test_vendors_to_csv_golden(tmp_path):
+    vendors = tmp_path / 'vendors'
+    shutil.copytree(fixture('vendors'), vendors)
+    run_script('vendors-to-csv.py', sorted(os.listdir(vendors)), cwd=vendors)
+    rows = read_csv(vendors / 'tau-vendors.csv')
+    assert rows == read_csv(fixture('tau-vendors.csv'))
+    # the fixture pages were saved from the same vendors as tau-vendors.csv
+    recorded = read_csv(os.path.join(REPO, 'tau-vendors.csv'))
+    for row in rows:
+        assert row in recorded
+
+
+def test_vendor_anomalies():
+    anomalies = load_script('vendor-anomalies.py')
+    entries = anomalies.read_csv_entries(os.path.join(REPO, 'tau-vendors.csv'))
+    distribution, markups, ambiguous, outliers, ratios, stale = anomalies.analyse(entries)
+    assert ('Tau Station', 'broken-slate') in ambiguous
+    assert 1.0 in markups
+    assert not stale
+    # a wrong fuel price makes most prices on the station irregular
+    for e in entries:
+        if e['Station'] == 'Tau Station':
+            e['FuelPrice'] = str(float(e['FuelPrice']) * 1.01)
+    distribution, markups, ambiguous, outliers, ratios, stale = anomalies.analyse(entries)
+    assert list(stale) == ['Tau Station']
+    assert stale['Tau Station'].contains(435.0)
+    # the station's entries are still classified, with the probable fuel price
+    assert ('Tau Station', 'broken-slate') in ambiguous
+    assert 1.155 in markups
+    assert not any(entries[i]['Station'] == 'Tau Station' for i in outliers)
+    assert anomalies.analyse([]) == ({}, [], set(), set(), {}, {})
+
+def test_vendor_anomalies_several_stale_stations():
+    anomalies = load_script('vendor-anomalies.py')
+    entries = anomalies.read_csv_entries(os.path.join(REPO, 'tau-vendors.csv'))
+    # the probable fuel prices come from the markups of the other stations
+    factors = { 'Tau Station': 1.013, 'The Ghost of Mali': 0.987, 'Spirit of Tianjin': 1.017, 'Paris Spatiale': 0.983 }
+    recorded = {}
+    for e in entries:
+        if e['Station'] in factors:
+            recorded[e['Station']] = float(e['FuelPrice'])
+            e['FuelPrice'] = str(recorded[e['Station']] * factors[e['Station']])
+    distribution, markups, ambiguous, outliers, ratios, stale = anomalies.analyse(entries)
+    assert sorted(stale) == sorted(factors)
+    for station, fuelprice in stale.items():
+        # the estimate, with its error, covers the recorded fuel price
+        assert fuelprice_interval(*anomalies.corrected_fuelprice(fuelprice)).contains(recorded[station])
+
+
+def test_vendor_anomalies_clean_csv(tmp_path):
+    rows = read_csv(os.path.join(REPO, 'tau-vendors.csv'))
+    for row in rows:
+        if row['Station'] == 'Tau Station':
+            row['FuelPrice'] = '%.1f' % (float(row['FuelPrice']) * 1.01)
+    with open(tmp_path / 'tau-vendors.csv', 'w') as fp:
+        cw = csv.DictWriter(fp, list(rows[0]))
+        cw.writeheader()
+        cw.writerows(rows)
+    output = run_script('vendor-anomalies.py', cwd=tmp_path)
+    assert "stale fuel price? most item prices on Tau Station don't match" in output
+    clean = read_csv(tmp_path / 'tau-vendors-clean.csv')
+    # the estimated fuel price is marked with its error, the observed ones aren't
+    for row in clean:
+        if row['Station'] == 'Tau Station':
+            assert fuelprice_interval(row['FuelPrice'], row['FuelPriceError']).contains(435.0)
+        else:
+            assert row['FuelPriceError'] == ''
+
+
+def crawl(site, tmp_path, args=(), failing=True, fuelprice=435.0):
+    """Serve the fixture vendor pages from the local site (plus a missing one
+    if failing), and crawl them."""
+    vendors = site.root / 'area' / 'vendors'
+    vendors.mkdir(parents=True, exist_ok=True)
+    with open(site.root / 'tracker.json', 'w') as fp:
+        json.dump([{ 'station': { 'name': 'Tau Station', 'system': 'Sol', 'short': 'Tau' },
+                     'fuel_price_per_g': fuelprice, 'vendors': {} }], fp)
+    urls = tmp_path / 'vendor-urls.csv'
+    with open(urls, 'w') as fp:
+        fp.write("System,Station,URL,FuelPrice\n")
+        for stationdir in sorted(glob(fixture('vendors', '*', '*'))):
+            system, station = stationdir.split(os.sep)[-2:]
+            # one station with its fuel price given, the other from the tracker
+            fuelprice = '3133.4' if station == 'Cirque Centauri' else ''
+            for page in sorted(glob(os.path.join(stationdir, '*.html'))):
+                name = os.path.basename(page)[:-5]
+                shutil.copy(page, vendors / name)
+                fp.write('%s,%s,area/vendors/%s,%s\n' % (system, station, name, fuelprice))
+        if failing:
+            fp.write("Sol,Tau Station,area/vendors/no-such-vendor,\n")
+    workdir = tmp_path / 'crawl'
+    workdir.mkdir(exist_ok=True)
+    env = dict(os.environ, TAU_HTTP_MODE='live', TAU_HTTP_RATE='0', TAU_SITE_URL=site.url,
+               TAU_TRACKER_URL=site.url + 'tracker.json')
+    result = subprocess.run([sys.executable, os.path.join(REPO, 'get-vendors.py')] + list(args) + [str(urls)],
+                            cwd=workdir, env=env, capture_output=True, text=True)
+    return workdir, result
+
+
+def test_crawl_vendor_pages(site, tmp_path):
+    workdir, result = crawl(site, tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert len(result.stdout.splitlines()) == 2
+    assert "FAILED" in result.stderr
+    for path in glob(fixture('vendors', '*', '*', '*')):
+        saved = os.path.join(workdir, os.path.relpath(path, fixture('vendors')))
+        with open(path) as expected, open(saved) as fp:
+            assert fp.read().strip() == expected.read().strip()
+    assert not glob(str(workdir / '*' / '*' / '*.part'))
+    run_script('vendors-to-csv.py', ['Alpha Centauri', 'Sol'], cwd=workdir)
+    assert read_csv(workdir / 'tau-vendors.csv') == read_csv(fixture('tau-vendors.csv'))
+
+
+def test_crawl_vendor_pages_resumed(site, tmp_path):
+    workdir, result = crawl(site, tmp_path, failing=False)
+    assert len(result.stdout.splitlines()) == 2
+    fuelprice_file = workdir / 'Sol' / 'Tau Station' / 'fuel-price'
+    # a complete station is kept, with the fuel price its pages were saved with
+    workdir, result = crawl(site, tmp_path, failing=False, fuelprice=500.0)
+    assert result.stdout == ""
+    assert vendor_pages.read_fuel_price(fuelprice_file.parent) == '435.0'
+    # an incomplete one is fetched again, with the current fuel price
+    os.remove(workdir / 'Sol' / 'Tau Station' / 'benevolent-dynamics.html')
+    workdir, result = crawl(site, tmp_path, failing=False, fuelprice=500.0)
+    assert len(result.stdout.splitlines()) == 1
+    assert vendor_pages.read_fuel_price(fuelprice_file.parent) == '500.0'
+
+
+def test_crawl_vendor_rows(site, tmp_path):
+    workdir, result = crawl(site, tmp_path, ['--csv', '-j', '2'], failing=False)
+    assert result.returncode == 0, result.stderr
+    assert sorted(os.listdir(workdir)) == ['tau-vendors.csv']
+    assert read_csv(workdir / 'tau-vendors.csv') == read_csv(fixture('tau-vendors.csv'))
+    # with a failed page, the previous file is kept
+    workdir, result = crawl(site, tmp_path, ['--csv'])
+    assert result.returncode == 1 and "unchanged" in result.stderr
+    assert read_csv(workdir / 'tau-vendors.csv') == read_csv(fixture('tau-vendors.csv'))
+    assert sorted(os.listdir(workdir)) == ['tau-vendors.csv', 'tau-vendors.csv.part']
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+
+import csv
+import json
+import statistics
+import sys
+
+import vendor_pages
+from intervals import Interval
+
+# ratios of an item's FPC to its most common FPC seen at least this often, on
+# at least two stations, count as a regular vendor markup (vendors of different
+# kinds have different markups)
+MIN_MARKUP_COUNT = 3
+MIN_MARKUP_STATIONS = 2
+# relative tolerance for matching a markup
+MARKUP_TOLERANCE = 0.002
+# a station where more than this fraction of the items don't match any markup
+# probably has a stale fuel price
+STALE_FRACTION = 0.5
+# ... if there are at least that many items to compare
+STALE_MIN_ENTRIES = 10
+
+
+def read_csv_entries(fname):
+    with open(fname) as fp:
+        return list(csv.DictReader(fp))
+
+
+def read_json_entries(stations_json):
+    """The vendor entries from tracker JSON data, referring back to the JSON."""
+    entries = []
+    for station_info in stations_json:
+        station = station_info['station']['name']
+        for (vendor,inventory) in station_info['vendors'].items():
+            for (slug,itemprice) in inventory.items():
+                entries.append({
+                    'slug': slug,
+                    'ItemPrice': itemprice,
+                    'Currency': 'credits',
+                    'Vendor': vendor,
+                    'Station': station,
+                    'FuelPrice': station_info['fuel_price_per_g']
+                })
+    return entries
+
+
+def analyse(entries, stale=frozenset()):
+    """Find ambiguous vendors, outliers and stale fuel prices, in one pass over
+    the entries plus a bit of work per slug and per station.
+    Returns the distribution per slug, the regular markups, the sets of
+    ambiguous (station, slug) pairs and outlier entries (by index), the ratios
+    to the common FPC (by index) and the stale stations with their probable
+    fuel prices."""
+    # collect prices per station and slug, and entries per slug
+    prices = {}
+    entries_by_slug = {}
+    for i, e in enumerate(entries):
+        if e['Currency'] != 'credits' or e['Station'] in stale: continue
+        key = (e['Station'], e['slug'])
+        if not key in prices:
+            prices[key] = set()
+        prices[key].add(float(e['ItemPrice']))
+        if not e['slug'] in entries_by_slug:
+            entries_by_slug[e['slug']] = []
+        entries_by_slug[e['slug']].append(i)
+    ambiguous = set(key for key, p in prices.items() if len(p) > 1)
+
+    # FPC distribution per slug, and ratio to the most common FPC
+    distribution = {}
+    ratios = {}
+    for slug, indices in entries_by_slug.items():
+        indices = [ i for i in indices if not (entries[i]['Station'], slug) in ambiguous ]
+        if not indices: continue
+        fpcs = [ float(entries[i]['ItemPrice']) / float(entries[i]['FuelPrice']) for i in indices ]
+        # most common by number of stations, so one station with many vendors
+        # (or a wrong fuel price) doesn't decide it
+        stations_by_fpc = {}
+        for i, fpc in zip(indices, fpcs):
+            k = float('%.4g' % fpc)
+            if not k in stations_by_fpc:
+                stations_by_fpc[k] = set()
+            stations_by_fpc[k].add(entries[i]['Station'])
+        reference = max(stations_by_fpc, key = lambda k: (len(stations_by_fpc[k]), -k))
+        stations = set(entries[i]['Station'] for i in indices)
+        distribution[slug] = {
+            'slug': slug,
+            'Stations': len(stations),
+            'Entries': len(indices),
+            'MinFPC': min(fpcs),
+            'MedianFPC': statistics.median(fpcs),
+            'MaxFPC': max(fpcs),
+            'CommonFPC': reference
+        }
+        # only compare with an FPC that at least two stations agree on
+        if len(stations_by_fpc[reference]) > 1:
+            for i, fpc in zip(indices, fpcs):
+                ratios[i] = fpc / reference
+
+    markups = regular_markups(entries, ratios)
+    outliers = set(i for i, ratio in ratios.items() if not is_regular(ratio, markups))
+
+    # stations with mostly irregular prices
+    compared = {}
+    irregular = {}
+    for i in ratios:
+        station = entries[i]['Station']
+        compared[station] = compared.get(station, 0) + 1
+        if i in outliers:
+            irregular[station] = irregular.get(station, 0) + 1
+    new_stale = set(station for station, n in compared.items()
+                    if n >= STALE_MIN_ENTRIES and irregular.get(station, 0) > STALE_FRACTION * n)
+    if new_stale:
+        # the stale stations spoil the common FPCs and markups, so do it again without them
+        result = analyse(entries, stale | new_stale)
+        distribution, markups, ambiguous, outliers, ratios, fuelprices = result
+        # slugs with a common FPC that at least two of the other stations agree on
+        compared = set(entries[i]['slug'] for i in ratios)
+        for station in new_stale:
+            slugs = station_entries(entries, station)
+            fuelprice = probable_fuelprice(entries, slugs, distribution, compared, markups)
+            fuelprices[station] = fuelprice
+            # classify the station's entries like the others, with the probable fuel price
+            for slug, indices in slugs.items():
+                if len(set(float(entries[i]['ItemPrice']) for i in indices)) > 1:
+                    ambiguous.add((station, slug))
+                elif fuelprice is not None and slug in compared:
+                    for i in indices:
+                        ratios[i] = float(entries[i]['ItemPrice']) / fuelprice.midpoint() / distribution[slug]['CommonFPC']
+        # with the corrected ratios, the markups seen on the stale stations count too
+        markups = regular_markups(entries, ratios)
+        outliers = set(i for i, ratio in ratios.items() if not is_regular(ratio, markups))
+        return distribution, markups, ambiguous, outliers, ratios, fuelprices
+    return distribution, markups, ambiguous, outliers, ratios, {}
+
+
+def regular_markups(entries, ratios):
+    """The regular markups: the ratios to the common FPC that are seen often."""
+    counts = {}
+    stations_by_ratio = {}
+    for i, ratio in ratios.items():
+        k = round(ratio, 3)
+        counts[k] = counts.get(k, 0) + 1
+        if not k in stations_by_ratio:
+            stations_by_ratio[k] = set()
+        stations_by_ratio[k].add(entries[i]['Station'])
+    return sorted(k for k, n in counts.items()
+                  if n >= MIN_MARKUP_COUNT and len(stations_by_ratio[k]) >= MIN_MARKUP_STATIONS)
+
+
+def is_regular(ratio, markups):
+    return any(abs(ratio / m - 1.0) <= MARKUP_TOLERANCE for m in markups)
+
+
+def station_entries(entries, station):
+    """The indices of the station's entries (in credits), by slug."""
+    slugs = {}
+    for i, e in enumerate(entries):
+        if e['Station'] != station or e['Currency'] != 'credits': continue
+        if not e['slug'] in slugs:
+            slugs[e['slug']] = []
+        slugs[e['slug']].append(i)
+    return slugs
+
+
+def probable_fuelprice(entries, slugs, distribution, compared, markups):
+    """The fuel price that would make the station's item prices match the
+    nearest markups, using the common FPCs and markups found without the
+    station.  slugs are the station's entries by slug, of which only those
+    with an unambiguous price and a common FPC (the compared slugs) are used.
+    Returns the range of fuel prices the matching items give, as Interval,
+    or None if there is nothing to compare with.  It is an estimate, not a
+    guaranteed bound like the rounding of an observed price."""
+    if not markups: return None
+    fuelprices = []
+    for slug, indices in slugs.items():
+        prices = set(float(entries[i]['ItemPrice']) for i in indices)
+        if len(prices) > 1 or not slug in compared: continue
+        itemprice = prices.pop()
+        fpc = float(entries[indices[0]]['ItemPrice']) / float(entries[indices[0]]['FuelPrice'])
+        ratio = fpc / distribution[slug]['CommonFPC']
+        markup = min(markups, key = lambda m: abs(ratio / m - 1.0))
+        # the fuel price at which the item's FPC is the markup times the common one
+        fuelprices.append(itemprice / (markup * distribution[slug]['CommonFPC']))
+    if not fuelprices: return None
+    median = statistics.median(fuelprices)
+    # the items that agree with the median (the others matched the wrong markup)
+    agreeing = [ fp for fp in fuelprices if abs(fp / median - 1.0) <= MARKUP_TOLERANCE ]
+    return Interval(min(agreeing), max(agreeing))
+
+
+def corrected_fuelprice(fuelprice):
+    """The probable fuel price (an Interval) as written to the cleaned data:
+    the midpoint, and the error that covers the interval despite the rounding
+    to 2 decimals."""
+    return ('%.2f' % fuelprice.midpoint(), '%.2f' % (0.5 * fuelprice.length() + 0.01))
+
+
+def is_clean(entry, i, ambiguous, outliers, stale):
+    """Whether to keep the entry; stale stations are kept (with the probable
+    fuel price) only if there is one."""
+    if entry['Station'] in stale and stale[entry['Station']] is None: return False
+    if (entry['Station'], entry['slug']) in ambiguous: return False
+    return not i in outliers
+
+
+if __name__ == '__main__':
+    infile = sys.argv[1] if len(sys.argv) > 1 else 'tau-vendors.csv'
+    is_json = infile.endswith('.json')
+    if is_json:
+        with open(infile) as fp:
+            stations_json = json.load(fp)
+        entries = read_json_entries(stations_json)
+        outfile = infile[:-5] + '-clean.json'
+    else:
+        entries = read_csv_entries(infile)
+        outfile = infile[:-4] + '-clean.csv'
+
+    distribution, markups, ambiguous, outliers, ratios, stale = analyse(entries)
+
+    # report
+    print("regular markups:", " ".join("%.3f" % m for m in markups))
+    for station, slug in sorted(ambiguous):
+        print("ambiguous pricing: '%s' on %s" % (slug, station))
+    for i in sorted(outliers, key = lambda i: (entries[i]['Station'], entries[i]['slug'])):
+        e = entries[i]
+        print("outlier: '%s' at %s on %s, FPC %.3f times the common one"
+            % (e['slug'], e['Vendor'], e['Station'], ratios[i]))
+    for station in sorted(stale):
+        fuelprice = stale[station]
+        print("stale fuel price? most item prices on %s don't match%s"
+            % (station, "" if fuelprice is None else ", it's probably %.2f (%s)" % (fuelprice.midpoint(), fuelprice)))
+    nclean = sum(1 for i, e in enumerate(entries) if is_clean(e, i, ambiguous, outliers, stale))
+    print("%d entries, %d removed" % (len(entries), len(entries) - nclean))
+
+    with open('fpc-distribution.csv', 'w') as fp:
+        fieldnames = ['slug', 'Stations', 'Entries', 'MinFPC', 'MedianFPC', 'MaxFPC', 'CommonFPC']
+        cw = csv.DictWriter(fp, fieldnames)
+        cw.writeheader()
+        for slug in sorted(distribution):
+            cw.writerow(distribution[slug])
+
+    # write the cleaned data in the same format
+    if is_json:
+        info_by_station = {}
+        for station_info in stations_json:
+            station = station_info['station']['name']
+            info_by_station[station] = station_info
+            for vendor in station_info['vendors']:
+                station_info['vendors'][vendor] = {}
+            if stale.get(station) is not None:
+                # an estimate, with its error instead of the rounding of an observed price
+                fuelprice, error = corrected_fuelprice(stale[station])
+                station_info['fuel_price_per_g'] = float(fuelprice)
+                station_info['fuel_price_error'] = float(error)
+        for i, e in enumerate(entries):
+            if is_clean(e, i, ambiguous, outliers, stale):
+                info_by_station[e['Station']]['vendors'][e['Vendor']][e['slug']] = e['ItemPrice']
+        with open(outfile, 'w') as fp:
+            json.dump(stations_json, fp)
+    else:
+        fieldnames = list(entries[0].keys()) if entries else list(vendor_pages.FIELDNAMES)
+        if stale:
+            fieldnames.append('FuelPriceError')
+        with open(outfile, 'w') as fp:
+            cw = csv.DictWriter(fp, fieldnames)
+            cw.writeheader()
+            for i, e in enumerate(entries):
+                if is_clean(e, i, ambiguous, outliers, stale):
+                    if e['Station'] in stale:
+                        # an estimate, with its error instead of the rounding of an observed price
+                        e['FuelPrice'], e['FuelPriceError'] = corrected_fuelprice(stale[e['Station']])
+                    cw.writerow(e)
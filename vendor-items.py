@@ -9,6 +9,6 @@ if __name__ == '__main__':
         for entry in cr:
             slug = entry['slug']
             slugs.add(slug)
-    for slug in slugs:
+    for slug in sorted(slugs):
         print(slug)
 
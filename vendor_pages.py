@@ -0,0 +1,79 @@
+"""
+The items offered on a vendor page of the game site, and the directory layout
+the pages are saved in: one directory per system, with one directory per
+station, holding the vendor pages (*.html) and a file 'fuel-price' with the
+station's fuel price at the time the pages were saved.
+"""
+
+import csv
+import os.path
+import re
+
+from bs4 import BeautifulSoup
+
+FIELDNAMES = ['ItemName', 'ItemPrice', 'Currency', 'Category', 'Vendor', 'Station', 'FuelPrice', 'System', 'slug']
+
+
+def parse_vendor_page(html, fuelprice, system, station=None):
+    """The items on the vendor page, as rows of tau-vendors.csv.  The station
+    is taken from the page title, or the given one if the title has none."""
+    phtml = BeautifulSoup(html, "lxml")
+    head = phtml.head
+    body = phtml.body
+    # extract station
+    title = head.find('title')
+    match = re.match(r' *Vendors/(.+) — τ', title.text)
+    if match:
+        station = match.group(1)
+    # extract vendor
+    tag = body.find('h2', attrs={'class':"vendor-details-heading"})
+    vendor = tag.text
+    # extract inventory
+    inventory = body.find('div', attrs={'class':"inventory"})
+    items = []
+    for item in inventory.findAll('button', attrs={'class':"item modal-toggle"}):
+        slug = item.attrs['data-item-name']
+        # category = item.attrs['data-item-type']
+        span = item.find('span', attrs={'class':'name'})
+        lines = [ x.strip() for x in filter(lambda x: x and not x.isspace(), span.text.split('\n')) ]
+        category = lines[0].rstrip(':')
+        name = lines[1]
+        itemprice = lines[3].replace(',', '')
+        currency = lines[4]
+        items.append({
+            'ItemName': name,
+            'ItemPrice': itemprice,
+            'Currency': currency,
+            'Category': category,
+            'Vendor': vendor,
+            'Station': station,
+            'FuelPrice': fuelprice,
+            'System': system,
+            'slug': slug
+            })
+    return items
+
+
+def read_fuel_price(stationdir):
+    with open(os.path.join(stationdir, "fuel-price")) as f:
+        return f.read().strip()
+
+
+def write_fuel_price(stationdir, fuelprice):
+    with open(os.path.join(stationdir, "fuel-price"), "w") as f:
+        f.write(str(fuelprice) + "\n")
+
+
+def slurp_vendor(vfile, system):
+    """The items on a saved vendor page."""
+    fuelprice = read_fuel_price(os.path.dirname(vfile))
+    with open(vfile) as f:
+        html = f.read()
+    return parse_vendor_page(html, fuelprice, system)
+
+
+def csv_writer(cf):
+    """A writer for the rows of tau-vendors.csv, with the header written."""
+    cw = csv.DictWriter(cf, FIELDNAMES)
+    cw.writeheader()
+    return cw